@@ -1,31 +1,128 @@
+import argparse
 import os
-import ezdxf
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-def all_entities_to_block(doc, block_name):
+import dxf_cache
+import instrument
+
+def all_entities_to_block(doc, block_name, move=True):
+    """把模型空间的全部实体放进块 ``block_name``，模型空间只留一个块参照
+
+    ``move`` 为真时直接把现有实体移入块定义，不做深拷贝，句柄保持不变；
+    为假时沿用旧做法：逐个复制到块中再删除模型空间实体。
+    """
     msp = doc.modelspace()
     entities = list(msp)
     # 如果已经存在同名块，先删除
     if block_name in doc.blocks:
-        doc.blocks.remove(block_name)
+        doc.blocks.delete_block(block_name, safe=False)
     block = doc.blocks.new(name=block_name)
-    for e in entities:
-        block.add_entity(e.copy())
-    # 清空原有模型空间
-    msp.delete_all_entities()
+    if move:
+        # 整体清空模型空间的实体列表（不销毁实体），再逐个挂到块上
+        msp.entity_space.clear()
+        for e in entities:
+            block.add_entity(e)
+    else:
+        for e in entities:
+            block.add_entity(e.copy())
+        # 清空原有模型空间
+        msp.delete_all_entities()
     # 插入块引用
     msp.add_blockref(block_name, (0, 0))
 
-def process_directory(directory):
-    for filename in os.listdir(directory):
-        if filename.lower().endswith('.dxf'):
-            file_path = os.path.join(directory, filename)
-            print(f'Processing {file_path}...')
-            doc = ezdxf.readfile(file_path)
-            block_name = os.path.splitext(filename)[0]
+def is_wrapped(doc, block_name):
+    """模型空间只有一个指向 ``block_name`` 的块参照时，说明文件已处理过"""
+    entities = list(doc.modelspace())
+    return (
+        len(entities) == 1
+        and entities[0].dxftype() == 'INSERT'
+        and entities[0].dxf.name == block_name
+        and block_name in doc.blocks
+    )
+
+def save_atomic(doc, file_path, binary=False):
+    """先写入同目录下的临时文件再替换原文件，保存中断时原文件不受影响
+
+    临时文件名以 ``.`` 开头、以 ``.dxf.tmp`` 结尾，进程被中途终止时留下的
+    残余文件不会被按 ``*.dxf`` 扫描目录的脚本当作图纸处理。
+    ``binary`` 为真时保存为二进制DXF。
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.dxf.tmp', dir=directory)
+    os.close(fd)
+    try:
+        doc.saveas(tmp_path, fmt='bin' if binary else 'asc')
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def process_file(file_path, binary=False):
+    """处理单个文件，返回 ``(file_path, 状态, 错误信息)``
+
+    输入可以是 ASCII 或二进制DXF；``binary`` 决定写回的格式。
+    """
+    name = os.path.basename(file_path)
+    try:
+        with instrument.span('read', file=name):
+            doc = dxf_cache.readfile(file_path)
+        block_name = os.path.splitext(name)[0]
+        if is_wrapped(doc, block_name):
+            return file_path, 'skipped', None
+        with instrument.span('wrap', file=name, entities=len(doc.modelspace())):
             all_entities_to_block(doc, block_name)
-            doc.saveas(file_path)  # 覆盖原文件
+        with instrument.span('save', file=name):
+            save_atomic(doc, file_path, binary)  # 覆盖原文件
+        dxf_cache.store(file_path, doc)  # 后续合并时不必重新解析
+    except Exception as e:
+        return file_path, 'failed', str(e)
+    return file_path, 'done', None
+
+def process_directory(directory, jobs=1, binary=False):
+    files = [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if filename.lower().endswith('.dxf')
+    ]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(partial(process_file, binary=binary), files))
+    else:
+        results = []
+        for file_path in files:
+            print(f'Processing {file_path}...')
+            results.append(process_file(file_path, binary))
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    for file_path, status, error in results:
+        counts[status] += 1
+        if status == 'done':
             print(f'Finished {file_path}')
+        elif status == 'skipped':
+            print(f'Skipped {file_path} (already wrapped)')
+        else:
+            print(f'Failed {file_path}: {error}')
+    print(f"{counts['done']} wrapped, {counts['skipped']} skipped, {counts['failed']} failed")
+    return counts
 
 if __name__ == '__main__':
-    folder = r'C:\Users\Administrator\Documents\沪乍杭补定测\04-任务单\线路任务单\dxfs'  # 修改为你的目录
-    process_directory(folder)
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description='Wrap the modelspace of every DXF into a block named after the file'
+    )
+    parser.add_argument('directory', help='Folder containing the DXF files (files are overwritten)')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count() or 1,
+        help='Number of worker processes (default: number of CPUs)',
+    )
+    parser.add_argument(
+        '--binary', action='store_true',
+        help='Write the wrapped files as binary DXF',
+    )
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+    instrument.from_args(args)
+    process_directory(args.directory, args.jobs, args.binary)
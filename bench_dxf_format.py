@@ -0,0 +1,60 @@
+"""Benchmark binary against ASCII DXF: file size, save time and load time.
+
+Every given drawing (``output.dxf`` by default) is loaded once and saved in
+both formats into a temporary folder; the saved files are then loaded
+again with ``ezdxf.readfile``, which detects the format by itself::
+
+    python bench_dxf_format.py
+    python bench_dxf_format.py 反任务单汇总.dxf --repeat 5
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import ezdxf
+
+
+def _best(func, repeat: int) -> float:
+    """Return the fastest of ``repeat`` runs of ``func`` in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def measure(path: str, tmp_dir: str, repeat: int) -> dict:
+    """Return ``{fmt: (bytes, save_seconds, load_seconds)}`` for ``path``."""
+    doc = ezdxf.readfile(path)
+    results = {}
+    for fmt in ("asc", "bin"):
+        target = os.path.join(tmp_dir, f"bench.{fmt}.dxf")
+        save = _best(lambda: doc.saveas(target, fmt=fmt), repeat)
+        load = _best(lambda: ezdxf.readfile(target), repeat)
+        results[fmt] = (os.path.getsize(target), save, load)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare binary and ASCII DXF")
+    parser.add_argument("dxf", nargs="*", default=["output.dxf"], help="DXF files to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (default: 3)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in args.dxf:
+            results = measure(path, tmp_dir, args.repeat)
+            print(path)
+            for fmt, (size, save, load) in results.items():
+                print(
+                    f"  {fmt}: {size / 2**10:.0f} KiB, "
+                    f"save {save:.3f}s, load {load:.3f}s"
+                )
+            asc, binary = results["asc"], results["bin"]
+            print(
+                f"  binary vs ASCII: {binary[0] / asc[0]:.0%} size, "
+                f"save {asc[1] / binary[1]:.1f}x, load {asc[2] / binary[2]:.1f}x faster"
+            )
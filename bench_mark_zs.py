@@ -0,0 +1,226 @@
+"""Benchmark ``task_report.mark_zs_file`` against the former cell loop.
+
+The former implementation loaded the ZS workbook for editing, read every
+row through ``ws.cell`` and rewrote the return flag of every task; it is
+kept here as the reference.  Both run on a synthetic ledger with many form
+sheets and a "汇总" sheet, and on the real workbook, and report wall time,
+peak traced memory and whether the written workbooks hold the same
+values.  The marked synthetic ledger is then marked once more, as happens
+when the report is run again before new results come back::
+
+    python bench_mark_zs.py
+    python bench_mark_zs.py --sheets 200 --rows 500 --returned 0.3
+
+The parse cache of ``task_report`` is disabled (``TASK_REPORT_CACHE=0``).
+"""
+
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+
+import task_report
+from task_report import DEFAULT_RETURNED_FILE, DEFAULT_ZS_FILE, TASK_TEXT_RE
+
+
+def mark_zs_file_loop(zs_file: str, returned_tasks: dict) -> tuple:
+    """The former ``mark_zs_file``: edit every row of the loaded workbook."""
+    wb = openpyxl.load_workbook(zs_file)
+    form_stats = {}
+
+    for sheet_name in wb.sheetnames:
+        if not re.match(r"\d+", sheet_name):
+            continue
+        ws = wb[sheet_name]
+        header = [c.value for c in next(ws.iter_rows(min_row=1, max_row=1))]
+        try:
+            return_col = header.index("是否返回") + 1
+        except ValueError:
+            return_col = 2
+        total = 0
+        returned_count = 0
+        for row in range(2, ws.max_row + 1):
+            cells = [ws.cell(row=row, column=1).value]
+            if cells[0] is None:
+                cells = [c.value for c in ws[row]]
+            code = None
+            for cell in cells:
+                if isinstance(cell, str):
+                    m = TASK_TEXT_RE.search(cell)
+                    if m:
+                        code = (m.group(1).zfill(2), m.group(2).zfill(2))
+                        break
+            if not code:
+                continue
+            form_no, index = code
+            returned_indices = returned_tasks.get(form_no, set())
+            returned_flag = ("AL" in returned_indices) or (index in returned_indices)
+            ws.cell(row=row, column=return_col, value="是" if returned_flag else "否")
+            total += 1
+            if returned_flag:
+                returned_count += 1
+        base_form = re.match(r"(\d+)", sheet_name).group(1).zfill(2)
+        prev = form_stats.get(base_form, [0, 0])
+        form_stats[base_form] = [prev[0] + total, prev[1] + returned_count]
+
+    type_summary = {}
+    if "汇总" in wb.sheetnames:
+        ws = wb["汇总"]
+        for row in range(2, ws.max_row + 1):
+            form_val = ws.cell(row=row, column=1).value
+            if form_val is None:
+                continue
+            form_str = str(form_val).strip()
+            if not form_str or not re.match(r"\d+", form_str):
+                continue
+            stats = form_stats.get(re.match(r"\d+", form_str).group(0).zfill(2))
+            if stats:
+                ws.cell(row=row, column=4, value=stats[0])
+                ws.cell(row=row, column=5, value=stats[1])
+        for row in range(2, ws.max_row + 1):
+            task_type = ws.cell(row=row, column=2).value
+            total = ws.cell(row=row, column=4).value
+            returned_val = ws.cell(row=row, column=5).value
+            if task_type is None or total is None or returned_val is None:
+                continue
+            try:
+                total_i = int(total)
+                returned_i = int(returned_val)
+            except Exception:
+                continue
+            task_key = str(task_type).strip()
+            if "核补地形" in task_key and task_key != "核补地形":
+                task_key = "核补地形"
+            if total_i == 0 and returned_i == 0:
+                continue
+            info = type_summary.setdefault(task_key, {"提出数量": 0, "符合要求数量": 0})
+            info["提出数量"] += total_i
+            info["符合要求数量"] += returned_i
+
+    base, ext = os.path.splitext(zs_file)
+    output_file = f"{base}_processed{ext}"
+    wb.save(output_file)
+    return output_file, type_summary
+
+
+def make_ledger(path: str, sheets: int, rows: int, seed: int = 0) -> None:
+    """Write a ZS ledger with ``sheets`` form sheets of ``rows`` tasks each."""
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook()
+    summary = wb.active
+    summary.title = "汇总"
+    summary.append(["任务单序号", "任务类型", "提出时间", "提出数量", "符合要求数量", "是否闭合", "备注"])
+    kinds = ["地形图", "核补地形", "核补地形（补充）", "道路抄平"]
+    for form in range(1, sheets + 1):
+        summary.append([form, rnd.choice(kinds), "2025.5.8", 0, 0, None, None])
+        ws = wb.create_sheet(f"{form:02d}")
+        ws.append(["序号", "内容", "是否返回", "返回时间", "返回成果是否符合要求", "备注"])
+        for index in range(1, rows + 1):
+            # about half of the rows already carry a flag from an earlier run
+            flag = rnd.choice(["是", "否", None, None])
+            ws.append([None, f"{form}-{index}、核补范围内地形图（范围详见CAD）", flag, None, None, None])
+    wb.save(path)
+
+
+def make_returned(sheets: int, rows: int, share: float, seed: int = 0) -> dict:
+    rnd = random.Random(seed + 1)
+    returned = {}
+    for form in range(1, sheets + 1):
+        if rnd.random() < share / 10:
+            returned[f"{form:02d}"] = {"AL"}
+            continue
+        returned[f"{form:02d}"] = {
+            f"{i:02d}" for i in range(1, rows + 1) if rnd.random() < share
+        }
+    return returned
+
+
+def _values(path: str) -> dict:
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return {
+            name: [tuple(row) for row in wb[name].iter_rows(values_only=True)]
+            for name in wb.sheetnames
+        }
+    finally:
+        wb.close()
+
+
+def _measure(func, zs_file: str, returned: dict, work_dir: str) -> tuple:
+    """Run ``func`` on a private copy of ``zs_file``, return time, peak and result.
+
+    The time comes from a plain run, the peak traced memory from a second
+    run under ``tracemalloc``, which slows Python code down considerably.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    source = os.path.join(work_dir, os.path.basename(zs_file))
+    shutil.copyfile(zs_file, source)
+    start = time.perf_counter()
+    output, summary = func(source, returned)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(source, returned)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, output, summary
+
+
+def compare(label: str, zs_file: str, returned: dict, tmp_dir: str) -> str:
+    """Print both implementations on ``zs_file``, return the marked workbook."""
+    old_time, old_peak, old_out, old_summary = _measure(
+        mark_zs_file_loop, zs_file, returned, os.path.join(tmp_dir, "loop")
+    )
+    new_time, new_peak, new_out, new_summary = _measure(
+        task_report.mark_zs_file, zs_file, returned, os.path.join(tmp_dir, "two_phase")
+    )
+    same = old_summary == new_summary and _values(old_out) == _values(new_out)
+    print(f"{label}:")
+    print(f"  cell loop: {old_time:8.3f}s  peak {old_peak / 2**20:8.1f} MiB")
+    print(
+        f"  two-phase: {new_time:8.3f}s  peak {new_peak / 2**20:8.1f} MiB  "
+        f"({old_time / new_time:.1f}x time, {new_peak / old_peak:.2f}x memory)"
+        f"{'' if same else '  RESULT DIFFERS'}"
+    )
+    return new_out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark marking the ZS workbook")
+    parser.add_argument("--zs", default=DEFAULT_ZS_FILE, help="Real ZS workbook (default: %(default)s)")
+    parser.add_argument(
+        "--returned-file", default=DEFAULT_RETURNED_FILE,
+        help="Returned table for the real workbook (default: %(default)s)",
+    )
+    parser.add_argument("--sheets", type=int, default=100, help="Synthetic form sheets (default: 100)")
+    parser.add_argument("--rows", type=int, default=300, help="Tasks per sheet (default: 300)")
+    parser.add_argument(
+        "--returned", type=float, default=0.5, help="Share of returned tasks (default: 0.5)"
+    )
+    args = parser.parse_args()
+
+    os.environ["TASK_REPORT_CACHE"] = "0"  # time the parsing, not the cache
+
+    with tempfile.TemporaryDirectory(prefix="bench_mark_zs_") as tmp_dir:
+        ledger = os.path.join(tmp_dir, "ledger.xlsx")
+        make_ledger(ledger, args.sheets, args.rows)
+        returned = make_returned(args.sheets, args.rows, args.returned)
+        marked = compare(
+            f"synthetic, {args.sheets} sheets x {args.rows} rows", ledger, returned,
+            os.path.join(tmp_dir, "synthetic"),
+        )
+        # marking again with the same returned table changes no cell
+        compare("synthetic, already marked", marked, returned, os.path.join(tmp_dir, "rerun"))
+        if os.path.exists(args.zs):
+            compare(
+                args.zs, args.zs, task_report._load_returned_tasks(args.returned_file),
+                os.path.join(tmp_dir, "real"),
+            )
+        else:
+            sys.stderr.write(f"{args.zs} not found, skipped\n")
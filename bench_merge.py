@@ -0,0 +1,268 @@
+"""Benchmark the merge strategies on synthetic task sheets.
+
+Generates task-sheet DXFs (a frame, a title block, survey point blocks,
+linework and labels spread over several layers), then merges the first 10,
+100 and 1000 of them with every strategy of :mod:`merge_engine` and records
+wall time and peak memory.  Each merge runs in a fresh process so the peak
+RSS belongs to that merge alone::
+
+    python bench_merge.py -o bench.json
+    python bench_merge.py --counts 10 100 --strategies copy layer --entities 500
+    python bench_merge.py -o new.json --compare bench.json
+
+Results are written as JSON together with the git commit and the generator
+settings, ``--compare`` prints the change against an earlier results file.
+``--check`` only verifies that every strategy writes the same entities and
+extension dictionaries with ``stream`` as without it::
+
+    python bench_merge.py --check
+
+Parsed documents are not cached (``DXF_CACHE=0``) unless ``--cache`` is
+given.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+import ezdxf
+
+
+def make_task_sheet(path: str, seed: int, entities: int = 200, blocks: int = 5,
+                    block_reuse: int = 10, layers: int = 8,
+                    text_density: float = 0.2) -> None:
+    """Write a synthetic task sheet with about ``entities`` modelspace entities.
+
+    ``blocks`` point symbols are defined and each is inserted
+    ``block_reuse`` times; all sheets share the symbol names and most share
+    their content, so the merge has to deduplicate and rename blocks.  The
+    remaining entities are lines, polylines and circles on ``layers``
+    layers, a ``text_density`` share of them are labels.
+    """
+    rnd = random.Random(seed)
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+    layer_names = [f"DX{i:02d}" for i in range(layers)]
+    for i, name in enumerate(layer_names):
+        doc.layers.add(name, color=i % 255 + 1)
+
+    title = doc.blocks.new("TK")
+    title.add_lwpolyline([(0, 0), (180, 0), (180, 40), (0, 40)], close=True)
+    title.add_text("任务单", dxfattribs={"insert": (5, 30), "height": 5})
+    for b in range(blocks):
+        symbol = doc.blocks.new(f"PT{b}")
+        # one sheet in ten has its own variant of the symbol
+        size = 1.0 + (b if seed % 10 else b + 0.5)
+        symbol.add_circle((0, 0), size)
+        symbol.add_line((-size, 0), (size, 0))
+
+    x0 = seed * 1000.0
+    frame = msp.add_lwpolyline(
+        [(x0, 0), (x0 + 900, 0), (x0 + 900, 600), (x0, 600)], close=True
+    )
+    # sheet metadata kept in an extension dictionary, as CAD tools do
+    sheet_info = frame.new_extension_dict().add_xrecord("SHEET_INFO")
+    sheet_info.reset([(1, f"sheet{seed:04d}"), (40, x0)])
+    msp.add_blockref("TK", (x0 + 710, 10))
+    remaining = entities - 2
+    for b in range(blocks):
+        for _ in range(block_reuse):
+            if remaining <= 0:
+                break
+            msp.add_blockref(
+                f"PT{b}", (x0 + rnd.uniform(10, 890), rnd.uniform(60, 590)),
+                dxfattribs={"layer": rnd.choice(layer_names)},
+            )
+            remaining -= 1
+    for _ in range(max(remaining, 0)):
+        x, y = x0 + rnd.uniform(10, 890), rnd.uniform(60, 590)
+        attribs = {"layer": rnd.choice(layer_names)}
+        kind = rnd.random()
+        if kind < text_density:
+            attribs.update(insert=(x, y), height=2.5)
+            msp.add_text(f"K{rnd.randint(0, 99)}+{rnd.randint(0, 999):03d}", dxfattribs=attribs)
+        elif kind < text_density + (1 - text_density) / 2:
+            msp.add_line((x, y), (x + rnd.uniform(-20, 20), y + rnd.uniform(-20, 20)),
+                         dxfattribs=attribs)
+        elif kind < 0.9:
+            points = [(x + rnd.uniform(-30, 30), y + rnd.uniform(-30, 30)) for _ in range(6)]
+            msp.add_lwpolyline(points, dxfattribs=attribs)
+        else:
+            msp.add_circle((x, y), rnd.uniform(0.5, 5), dxfattribs=attribs)
+    doc.saveas(path)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_merge(files, strategy: str, output: str) -> dict:
+    """Worker: merge ``files`` once and return time and memory figures."""
+    from merge_engine import merge_files
+
+    base = _peak_rss_mb()
+    start = time.perf_counter()
+    stats = merge_files(files, output, strategy, report=lambda *args: None)
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_mb()
+    return {
+        "seconds": round(elapsed, 4),
+        "entities": stats["entities"],
+        "base_rss_mb": base and round(base, 1),
+        "peak_rss_mb": peak and round(peak, 1),
+        "output_bytes": os.path.getsize(output),
+    }
+
+
+def _signature(path: str) -> list:
+    """Handle-free content of the modelspace of ``path`` for comparisons."""
+    doc = ezdxf.readfile(path)
+    auditor = doc.audit()
+    result = [("audit", len(auditor.errors), len(auditor.fixes))]
+    for entity in doc.modelspace():
+        xrecords = []
+        if entity.has_extension_dict:
+            for key, obj in entity.get_extension_dict().items():
+                if obj.dxftype() == "XRECORD":
+                    xrecords.append((key, [tuple(tag) for tag in obj.tags]))
+        result.append((entity.dxftype(), entity.dxf.get("layer", "0"), xrecords))
+    return sorted(result, key=repr)
+
+
+def check_stream(files, strategies, work_dir: str) -> bool:
+    """Merge ``files`` with and without ``stream``, return whether all outputs agree."""
+    from merge_engine import merge_files
+
+    ok = True
+    for strategy in strategies:
+        signatures = []
+        for stream in (False, True):
+            output = os.path.join(work_dir, f"check_{strategy}_{stream}.dxf")
+            merge_files(files, output, strategy, stream=stream, report=lambda *args: None)
+            signatures.append(_signature(output))
+            os.unlink(output)
+        same = signatures[0] == signatures[1]
+        ok = ok and same
+        print(f"{strategy:>8} stream vs normal: {'same' if same else 'DIFFERENT'}")
+    return ok
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(counts, strategies, settings: dict, work_dir: str) -> list:
+    """Generate the sheets into ``work_dir`` and merge them, return the results."""
+    files = []
+    for i in range(max(counts)):
+        path = os.path.join(work_dir, f"sheet{i:04d}.dxf")
+        make_task_sheet(path, i, **settings)
+        files.append(path)
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for count in counts:
+        for strategy in strategies:
+            output = os.path.join(work_dir, f"merged_{strategy}_{count}.dxf")
+            with ctx.Pool(1) as pool:
+                result = pool.apply(_run_merge, (files[:count], strategy, output))
+            os.unlink(output)
+            result = dict(strategy=strategy, files=count, **result)
+            results.append(result)
+            print(
+                f"{strategy:>8} {count:>5} files: {result['seconds']:8.2f}s  "
+                f"peak {result['peak_rss_mb']} MiB"
+            )
+    return results
+
+
+def compare(results: list, previous: dict) -> None:
+    old = {(r["strategy"], r["files"]): r for r in previous["results"]}
+    print(f"compared with {previous.get('commit') or 'previous run'}:")
+    for r in results:
+        before = old.get((r["strategy"], r["files"]))
+        if before is None:
+            continue
+        line = f"{r['strategy']:>8} {r['files']:>5} files: time {r['seconds'] / before['seconds']:.2f}x"
+        if r["peak_rss_mb"] and before.get("peak_rss_mb"):
+            line += f", peak memory {r['peak_rss_mb'] / before['peak_rss_mb']:.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    from merge_engine import STRATEGIES
+
+    parser = argparse.ArgumentParser(description="Benchmark the DXF merge strategies")
+    parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="Earlier results to compare with")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument(
+        "--strategies", nargs="+", choices=sorted(STRATEGIES), default=sorted(STRATEGIES)
+    )
+    parser.add_argument("--entities", type=int, default=200, help="Entities per sheet (default: 200)")
+    parser.add_argument("--blocks", type=int, default=5, help="Point symbols per sheet (default: 5)")
+    parser.add_argument(
+        "--block-reuse", type=int, default=10, help="Inserts per symbol (default: 10)"
+    )
+    parser.add_argument("--layers", type=int, default=8, help="Layers per sheet (default: 8)")
+    parser.add_argument(
+        "--text-density", type=float, default=0.2,
+        help="Share of labels among the free entities (default: 0.2)",
+    )
+    parser.add_argument("--cache", action="store_true", help="Read through dxf_cache")
+    parser.add_argument(
+        "--check", action="store_true",
+        help="Only check that streamed merges equal normal ones on 10 sheets",
+    )
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ["DXF_CACHE"] = "0"  # inherited by the spawned workers
+    settings = {
+        "entities": args.entities,
+        "blocks": args.blocks,
+        "block_reuse": args.block_reuse,
+        "layers": args.layers,
+        "text_density": args.text_density,
+    }
+    if args.check:
+        with tempfile.TemporaryDirectory(prefix="bench_merge_") as tmp_dir:
+            files = []
+            for i in range(10):
+                files.append(os.path.join(tmp_dir, f"sheet{i:04d}.dxf"))
+                make_task_sheet(files[-1], i, **settings)
+            raise SystemExit(0 if check_stream(files, args.strategies, tmp_dir) else 1)
+
+    with tempfile.TemporaryDirectory(prefix="bench_merge_") as tmp_dir:
+        results = run_benchmark(sorted(args.counts), args.strategies, settings, tmp_dir)
+    data = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "ezdxf": ezdxf.__version__,
+        "settings": dict(settings, cache=args.cache),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(data, fp, ensure_ascii=False, indent=1)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fp:
+            compare(results, json.load(fp))
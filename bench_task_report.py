@@ -0,0 +1,109 @@
+"""Benchmark ``task_report._load_required_tasks`` against the former row loop.
+
+The former implementation parsed every form sheet separately and matched
+the task regex cell by cell in Python; it is kept here as the reference.
+Both are run on the same workbook, their results must be identical::
+
+    python bench_task_report.py
+    python bench_task_report.py --zs other.xlsx --jobs 1 4 --repeat 5
+
+``--scale N`` additionally times the scan alone on the form sheets
+repeated N times, which shows how both scale with the number of rows.
+
+The parse cache of ``task_report`` is disabled (``TASK_REPORT_CACHE=0``).
+"""
+
+import argparse
+import os
+import re
+import time
+
+import pandas as pd
+
+import task_report
+from task_report import DEFAULT_ZS_FILE, ROAD_LEVEL, TASK_TEXT_RE, TERRAIN
+
+
+def scan_loop(frames: list) -> dict:
+    """The row-by-row scan ``_load_required_tasks`` used before."""
+    tasks = {}
+    for df in frames:
+        for row in df.itertuples(index=False):
+            cells = [c for c in row if isinstance(c, str)]
+            if not cells:
+                continue
+            classification = None
+            row_text = "".join(cells)
+            if "抄平" in row_text or "超平" in row_text:
+                classification = ROAD_LEVEL
+            elif "核补" in row_text:
+                classification = TERRAIN
+            for cell in cells:
+                m = TASK_TEXT_RE.search(cell)
+                if m:
+                    form_no, index = m.groups()
+                    tasks[(form_no.zfill(2), index.zfill(2))] = classification
+                    break
+    return tasks
+
+
+def load_required_tasks_loop(filename: str) -> dict:
+    """The former ``_load_required_tasks``: parse each sheet, then loop."""
+    xls = pd.ExcelFile(filename)
+    return scan_loop([
+        xls.parse(sheet, header=None)
+        for sheet in xls.sheet_names if re.match(r"\d+", sheet)
+    ])
+
+
+def scan_vectorized(frames: list) -> dict:
+    return {key: category for _, _, key, category in task_report._scan_sheets_frames(frames)}
+
+
+def _best(func, repeat: int):
+    """Return ``(fastest seconds, result)`` of ``repeat`` runs of ``func``."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark loading the required tasks")
+    parser.add_argument("--zs", default=DEFAULT_ZS_FILE, help="ZS workbook (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 4], help="Worker counts to try")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (default: 3)")
+    parser.add_argument(
+        "--scale", type=int, default=50, help="Repeat the sheets N times for the scan-only run"
+    )
+    args = parser.parse_args()
+
+    os.environ["TASK_REPORT_CACHE"] = "0"  # time the parsing, not the cache
+
+    loop_time, expected = _best(lambda: load_required_tasks_loop(args.zs), args.repeat)
+    print(f"row loop:        {loop_time:.3f}s ({len(expected)} tasks)")
+    for jobs in args.jobs:
+        elapsed, result = _best(
+            lambda: task_report._load_required_tasks(args.zs, jobs), args.repeat
+        )
+        same = list(result.items()) == list(expected.items())
+        print(
+            f"vectorized j={jobs}: {elapsed:.3f}s ({loop_time / elapsed:.1f}x)"
+            f"{'' if same else '  RESULT DIFFERS'}"
+        )
+
+    if args.scale > 1:
+        xls = pd.ExcelFile(args.zs)
+        sheets = task_report._task_sheets(xls.sheet_names)
+        frames = list(xls.parse(sheets, header=None).values()) * args.scale
+        rows = sum(len(df) for df in frames)
+        loop_time, expected = _best(lambda: scan_loop(frames), args.repeat)
+        vec_time, result = _best(lambda: scan_vectorized(frames), args.repeat)
+        print(
+            f"scan only, {len(frames)} sheets / {rows} rows: loop {loop_time:.3f}s, "
+            f"vectorized {vec_time:.3f}s ({loop_time / vec_time:.1f}x)"
+            f"{'' if result == expected else '  RESULT DIFFERS'}"
+        )
@@ -1,6 +1,13 @@
 import argparse
+import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import instrument
+from file_utils import copy_atomic, file_hash, write_json_atomic
+
+INDEX_NAME = "collect_index.json"
 
 
 def collect_dwg(src_dir: str, dest_dir: str) -> None:
@@ -17,15 +24,148 @@ def collect_dwg(src_dir: str, dest_dir: str) -> None:
             src_path = os.path.join(root, name)
             dest_path = os.path.join(dest_dir, name)
             try:
-                shutil.copy2(src_path, dest_path)
+                with instrument.span("copy", file=name):
+                    shutil.copy2(src_path, dest_path)
                 print(f"Copied {src_path} -> {dest_path}")
             except Exception as e:
                 print(f"Failed to copy {src_path}: {e}")
 
 
+def _cached_hash(path: str, previous: dict) -> dict:
+    """Return ``{"sha256", "size", "mtime"}`` for ``path``.
+
+    The hash recorded in ``previous`` is reused while size and mtime match,
+    so unchanged files on network shares are not read again.
+    """
+    st = os.stat(path)
+    entry = {"size": st.st_size, "mtime": st.st_mtime_ns}
+    if (
+        previous
+        and previous.get("size") == st.st_size
+        and previous.get("mtime") == st.st_mtime_ns
+    ):
+        entry["sha256"] = previous["sha256"]
+    else:
+        entry["sha256"] = file_hash(path)
+    return entry
+
+
+def _load_index(dest_dir: str) -> dict:
+    try:
+        with open(os.path.join(dest_dir, INDEX_NAME), "r", encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def _unique_name(name: str, digest: str, taken: dict) -> str:
+    """Return ``name`` or, if another content owns it, ``stem_<hash8>.dwg``."""
+    owner = taken.get(name.lower())
+    if owner is None or owner == digest:
+        return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_{digest[:8]}{ext}"
+
+
+def collect_dwg_by_hash(src_dir: str, dest_dir: str, jobs: int = 4) -> dict:
+    """Copy DWG files from ``src_dir`` to ``dest_dir`` deduplicated by content.
+
+    Files are hashed and copied with ``jobs`` threads.  The first file (in
+    walk order) of every distinct content is kept; a name already used by
+    different content gets the first eight hash digits appended.  Files
+    already present in ``dest_dir`` with the same hash are not copied again.
+    ``collect_index.json`` in ``dest_dir`` maps every source path to its
+    hash and destination name, and is returned as a dict.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    old = _load_index(dest_dir)
+    old_sources = old.get("sources", {})
+    old_dests = old.get("dests", {})
+
+    sources = []
+    for root, dirs, files in os.walk(src_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.dwg'):
+                sources.append(os.path.join(root, name))
+    dest_files = [
+        name for name in sorted(os.listdir(dest_dir))
+        if name.lower().endswith('.dwg')
+    ]
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        src_entries = list(pool.map(
+            lambda p: _cached_hash(p, old_sources.get(p)), sources
+        ))
+        dest_entries = list(pool.map(
+            lambda n: _cached_hash(os.path.join(dest_dir, n), old_dests.get(n)),
+            dest_files,
+        ))
+
+        dests = dict(zip(dest_files, dest_entries))
+        taken = {n.lower(): e["sha256"] for n, e in dests.items()}
+        present = {}
+        for name, entry in dests.items():
+            present.setdefault(entry["sha256"], name)
+
+        index = {}
+        copies = []
+        for src_path, entry in zip(sources, src_entries):
+            digest = entry["sha256"]
+            dest_name = present.get(digest)
+            if dest_name is None:
+                dest_name = _unique_name(os.path.basename(src_path), digest, taken)
+                taken[dest_name.lower()] = digest
+                present[digest] = dest_name
+                copies.append((src_path, dest_name, digest))
+            index[src_path] = dict(entry, dest=dest_name)
+
+        def copy(item):
+            src_path, dest_name, digest = item
+            dest_path = os.path.join(dest_dir, dest_name)
+            try:
+                # an interrupted copy must not leave a truncated file under
+                # the final name, which would later count as other content
+                with instrument.span("copy", file=dest_name):
+                    copy_atomic(src_path, dest_path)
+                st = os.stat(dest_path)
+            except Exception as e:
+                return src_path, dest_path, e
+            entry = {"sha256": digest, "size": st.st_size, "mtime": st.st_mtime_ns}
+            return src_path, dest_path, entry
+
+        for src_path, dest_path, result in pool.map(copy, copies):
+            if isinstance(result, dict):
+                print(f"Copied {src_path} -> {dest_path}")
+                dests[os.path.basename(dest_path)] = result
+            else:
+                print(f"Failed to copy {src_path}: {result}")
+                failed = os.path.basename(dest_path)
+                index = {k: v for k, v in index.items() if v["dest"] != failed}
+
+    copied = sum(1 for _, name, _ in copies if name in dests)
+    print(f"Copied {copied} files, {len(index) - copied} already present or duplicate")
+    data = {"sources": index, "dests": dests}
+    write_json_atomic(os.path.join(dest_dir, INDEX_NAME), data, indent=1, sort_keys=True)
+    return data
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Collect unique DWG files")
     parser.add_argument("src", help="Source directory to scan")
     parser.add_argument("dest", help="Directory to copy unique DWG files to")
+    parser.add_argument(
+        "--by-hash", action="store_true",
+        help="Deduplicate by file content instead of file name",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=4,
+        help="Threads used for hashing and copying with --by-hash (default: 4)",
+    )
+    instrument.add_argument(parser)
     args = parser.parse_args()
-    collect_dwg(args.src, args.dest)
+    instrument.from_args(args)
+    if args.by_hash:
+        collect_dwg_by_hash(args.src, args.dest, args.jobs)
+    else:
+        collect_dwg(args.src, args.dest)
@@ -1,25 +1,393 @@
 import argparse
+import json
 import os
+import platform
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
+from typing import Optional
+
 from ezdxf.addons import odafc
 
+import instrument
+from file_utils import file_hash, write_json_atomic
+
+
+def _dwg_files(src: str) -> list:
+    """Return the DWG files directly inside ``src`` in a stable order."""
+    return sorted(
+        Path(src) / name
+        for name in os.listdir(src)
+        if name.lower().endswith('.dwg')
+    )
+
+
+def _odafc_path(system: str) -> str:
+    """Return the ODA File Converter executable.
+
+    Like :mod:`ezdxf.addons.odafc`, the ``unix_exec_path`` and
+    ``win_exec_path`` options of ezdxf are honoured.  Raises
+    :class:`odafc.ODAFCNotInstalledError` when no converter is found.
+    """
+    unix_exec_path = odafc.get_unix_exec_path()
+    if system != odafc.WINDOWS and unix_exec_path and Path(unix_exec_path).is_file():
+        return unix_exec_path
+    path = shutil.which("ODAFileConverter")
+    if not path and system == odafc.WINDOWS:
+        path = odafc.get_win_exec_path()
+        if not Path(path).is_file():
+            path = None
+    if not path:
+        raise odafc.ODAFCNotInstalledError("Could not find ODAFileConverter in the path")
+    return path
+
+
+def _odafc_arguments(filename: str, in_folder: str, out_folder: str,
+                     version: str) -> list:
+    """Return the converter arguments to audit and convert to DXF ``version``.
+
+    The command line is ``in_folder out_folder version type recurse audit
+    filter``, where ``filename`` is the input filter.
+    """
+    return [in_folder, out_folder, version, "DXF", "0", "1", filename]
+
+
+def _odafc_failed(system: str, returncode: int, stderr: str) -> bool:
+    stderr = stderr.strip()
+    if system == odafc.LINUX:
+        # the converter crashes on exit on Linux, even after a conversion
+        return stderr not in ("", "Quit (core dumped)")
+    return returncode != 0 or stderr != ""
+
+
+@contextmanager
+def _no_gui_display():
+    """Yield a DISPLAY value that keeps the converter GUI hidden.
+
+    On Linux a single Xvfb server is shared by all conversions of a run, so
+    parallel workers do not each start their own.  Elsewhere, or without
+    Xvfb, the current DISPLAY (possibly ``None``) is kept.
+    """
+    if platform.system() != odafc.LINUX or not shutil.which("Xvfb"):
+        yield os.environ.get("DISPLAY")
+        return
+    display = f":{os.getpid()}"
+    server = subprocess.Popen(
+        ["Xvfb", display, "-screen", "0", "800x600x24"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    time.sleep(0.1)
+    try:
+        yield display
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _run_odafc(arguments: list, display: Optional[str] = None,
+               timeout: Optional[float] = None) -> None:
+    """Run the ODA File Converter with ``arguments``.
+
+    Raises ``subprocess.TimeoutExpired`` when ``timeout`` seconds pass and
+    :class:`odafc.UnknownODAFCError` when the converter reports a failure.
+    Outside Windows the converter runs in its own process group, which is
+    killed as a whole on a timeout or an interrupt: on Linux the command
+    is a wrapper script and killing only the script would leave the actual
+    converter running.
+    """
+    system = platform.system()
+    command = [_odafc_path(system)] + arguments
+    if system == odafc.WINDOWS:
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags = (
+            subprocess.CREATE_NEW_CONSOLE | subprocess.STARTF_USESHOWWINDOW
+        )
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+        options = {"startupinfo": startupinfo}
+    else:
+        env = None
+        if display:
+            env = os.environ.copy()
+            env["DISPLAY"] = display
+        options = {"env": env, "start_new_session": True}
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, **options)
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except BaseException:
+        if system == odafc.WINDOWS:
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+        proc.communicate()
+        raise
+    if _odafc_failed(system, proc.returncode, stderr):
+        raise odafc.UnknownODAFCError(
+            f"ODA File Converter failed: return code = {proc.returncode}.\n"
+            f"stdout: {stdout}\nstderr: {stderr}"
+        )
+
+
+def _convert_file(src_path: Path, dest_path: Path, version: str,
+                  display: Optional[str] = None,
+                  timeout: Optional[float] = None) -> None:
+    """Convert a single DWG to ``dest_path`` like :func:`odafc.convert`."""
+    oda_version = odafc.map_version(version)
+    if oda_version not in odafc.VALID_VERSIONS:
+        raise odafc.UnsupportedVersion(f"Invalid version: '{version}'")
+    src_path = Path(src_path).expanduser().absolute()
+    with instrument.span("convert", file=src_path.name), \
+            tempfile.TemporaryDirectory(prefix="odafc_") as tmp_dir:
+        arguments = _odafc_arguments(
+            src_path.name, str(src_path.parent), tmp_dir, oda_version
+        )
+        _run_odafc(arguments, display, timeout)
+        result = list(Path(tmp_dir).iterdir())
+        if not result:
+            raise odafc.UnknownODAFCError("Unknown error: no DXF file was created")
+        shutil.move(str(result[0]), str(dest_path))
+
+
+def _stage_file(src_path: Path, staged: Path) -> None:
+    """Place ``src_path`` at ``staged``, hard linking when possible."""
+    try:
+        os.link(src_path, staged)
+    except OSError:
+        shutil.copy2(src_path, staged)
+
+
+def _convert_batch(pairs: list, version: str, display: Optional[str] = None,
+                   timeout: Optional[float] = None) -> dict:
+    """Convert several DWGs with a single converter launch.
+
+    ``pairs`` holds ``(src_path, dest_path)`` tuples.  The sources are
+    staged under numbered names in a temporary input folder, converted in
+    one ODA invocation and the outputs are moved back to their DEST names.
+    ``timeout`` is per file, so the whole batch may take ``len(pairs)``
+    times as long.  Returns ``{src_path: error}`` with ``None`` for every
+    file that was converted.
+    """
+    oda_version = odafc.map_version(version)
+    if oda_version not in odafc.VALID_VERSIONS:
+        error = odafc.UnsupportedVersion(f"Invalid version: '{version}'")
+        return {src_path: error for src_path, _ in pairs}
+    errors = {}
+    with tempfile.TemporaryDirectory(prefix="odafc_in_") as in_dir, \
+            tempfile.TemporaryDirectory(prefix="odafc_out_") as out_dir:
+        staged = {}
+        for i, (src_path, dest_path) in enumerate(pairs):
+            stem = f"{i:05d}"
+            try:
+                _stage_file(src_path, Path(in_dir) / (stem + ".dwg"))
+            except OSError as e:
+                errors[src_path] = e
+                continue
+            staged[stem] = (src_path, dest_path)
+        batch_error = None
+        if staged:
+            arguments = _odafc_arguments("*.DWG", in_dir, out_dir, oda_version)
+            try:
+                with instrument.span("convert_batch", files=len(staged)):
+                    _run_odafc(arguments, display,
+                               timeout * len(staged) if timeout else None)
+            except Exception as e:
+                batch_error = e
+        outputs = {p.stem: p for p in Path(out_dir).iterdir()}
+        for stem, (src_path, dest_path) in staged.items():
+            result = outputs.get(stem)
+            if result is None:
+                errors[src_path] = batch_error or odafc.UnknownODAFCError(
+                    "Unknown error: no DXF file was created"
+                )
+                continue
+            try:
+                shutil.move(str(result), str(dest_path))
+                errors[src_path] = None
+            except OSError as e:
+                errors[src_path] = e
+    return errors
+
 
-def convert_directory(src: str, dest: str, version: str = "R2013") -> None:
+MANIFEST_NAME = ".convert_manifest.json"
+
+
+def _converter_id() -> str:
+    """Identify the installed converter by its path, size and mtime.
+
+    The ODA File Converter has no version switch, so a replaced executable
+    is detected through its file metadata instead.
+    """
+    try:
+        path = _odafc_path(platform.system())
+        st = os.stat(path)
+    except Exception:
+        return ""
+    return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _load_manifest(dest: str, converter: str, version: str) -> dict:
+    """Load the DEST manifest; entries are dropped if the setup changed."""
+    try:
+        with open(Path(dest) / MANIFEST_NAME, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    if data.get("converter") != converter or data.get("version") != version:
+        return {}
+    return data.get("files", {})
+
+
+def _save_manifest(dest: str, converter: str, version: str, files: dict) -> None:
+    data = {"converter": converter, "version": version, "files": files}
+    write_json_atomic(Path(dest) / MANIFEST_NAME, data, indent=1, sort_keys=True)
+
+
+def _source_record(src_path: Path, previous: Optional[dict]) -> tuple:
+    """Return ``(record, unchanged)`` for ``src_path``.
+
+    The file is only hashed when size or mtime differ from ``previous``.
+    """
+    st = src_path.stat()
+    record = {"size": st.st_size, "mtime": st.st_mtime_ns}
+    if previous and previous.get("size") == st.st_size:
+        if previous.get("mtime") == st.st_mtime_ns:
+            record["sha256"] = previous.get("sha256")
+            return record, True
+        record["sha256"] = file_hash(src_path)
+        return record, record["sha256"] == previous.get("sha256")
+    record["sha256"] = file_hash(src_path)
+    return record, False
+
+
+def _print_summary(converted: int, skipped: int, failures: list,
+                   elapsed: float) -> None:
+    total = converted + len(failures)
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Converted {converted}/{total} files in {elapsed:.1f}s "
+        f"({rate:.2f} files/s)"
+    )
+    if skipped:
+        print(f"Skipped {skipped} unchanged files")
+    for path, error in failures:
+        print(f"  failed: {path}: {error}")
+
+
+def convert_directory(src: str, dest: str, version: str = "R2013",
+                      jobs: int = 1, timeout: Optional[float] = None,
+                      incremental: bool = False, batch_size: int = 1) -> dict:
     """Convert all DWG files in ``src`` to DXF in ``dest``.
 
+    ``jobs`` ODA converter processes run at the same time; at most
+    ``2 * jobs`` files are queued ahead of the running ones.  ``timeout``
+    limits the seconds a single conversion may take.  With ``incremental``
+    a manifest in ``dest`` records size, mtime and content hash of every
+    source together with the converter and target version, and DWGs that
+    did not change since the last run are skipped.  A ``batch_size`` above
+    one hands that many DWGs to a single converter launch (see
+    :func:`_convert_batch`) instead of starting one process per file.
+    Returns a summary with
+    the number of converted and skipped files, the failures and the elapsed
+    time.
+
     Requires the ODA File Converter to be installed and accessible.
     """
     os.makedirs(dest, exist_ok=True)
-    for name in os.listdir(src):
-        if not name.lower().endswith('.dwg'):
-            continue
-        src_path = Path(src) / name
-        dest_path = Path(dest) / (src_path.stem + '.dxf')
-        try:
-            odafc.convert(str(src_path), str(dest_path), version=version, replace=True)
+    jobs = max(1, jobs)
+    start = time.perf_counter()
+    converted = 0
+    skipped = 0
+    failures = []
+    converter = _converter_id() if incremental else ""
+    previous = _load_manifest(dest, converter, version) if incremental else {}
+    manifest = {}
+
+    def report(src_path, dest_path, outcome):
+        nonlocal converted, skipped
+        error, record, unchanged = outcome
+        if error is None:
+            manifest[src_path.name] = record
+            if unchanged:
+                skipped += 1
+                return
+            converted += 1
             print(f"Converted {src_path} -> {dest_path}")
-        except Exception as e:
-            print(f"Failed to convert {src_path}: {e}")
+        else:
+            if isinstance(error, subprocess.TimeoutExpired):
+                error = f"timed out after {timeout}s"
+            failures.append((str(src_path), str(error)))
+            print(f"Failed to convert {src_path}: {error}")
+
+    def run(pairs, display):
+        outcomes = {}
+        todo = []
+        for src_path, dest_path in pairs:
+            try:
+                record = None
+                if incremental:
+                    record, unchanged = _source_record(
+                        src_path, previous.get(src_path.name)
+                    )
+                    if unchanged and dest_path.exists():
+                        outcomes[src_path] = (None, record, True)
+                        continue
+                todo.append((src_path, dest_path, record))
+            except Exception as e:
+                outcomes[src_path] = (e, None, False)
+        if len(todo) == 1 and batch_size <= 1:
+            src_path, dest_path, record = todo[0]
+            try:
+                _convert_file(src_path, dest_path, version, display, timeout)
+                outcomes[src_path] = (None, record, False)
+            except Exception as e:
+                outcomes[src_path] = (e, record, False)
+        elif todo:
+            errors = _convert_batch(
+                [(s, d) for s, d, _ in todo], version, display, timeout
+            )
+            for src_path, _, record in todo:
+                outcomes[src_path] = (errors[src_path], record, False)
+        return [(s, d, outcomes[s]) for s, d in pairs]
+
+    files = _dwg_files(src)
+    size = max(1, batch_size)
+    tasks = [
+        [(p, Path(dest) / (p.stem + '.dxf')) for p in files[i:i + size]]
+        for i in range(0, len(files), size)
+    ]
+    with _no_gui_display() as display:
+        pending = set()
+        with ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext() as pool:
+            for pairs in tasks:
+                if pool is None:
+                    for result in run(pairs, display):
+                        report(*result)
+                    continue
+                if len(pending) >= 2 * jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for result in future.result():
+                            report(*result)
+                pending.add(pool.submit(run, pairs, display))
+            for future in pending:
+                for result in future.result():
+                    report(*result)
+
+    if incremental:
+        _save_manifest(dest, converter, version, manifest)
+    elapsed = time.perf_counter() - start
+    _print_summary(converted, skipped, failures, elapsed)
+    return {
+        "converted": converted,
+        "skipped": skipped,
+        "failed": failures,
+        "elapsed": elapsed,
+    }
 
 
 if __name__ == "__main__":
@@ -29,5 +397,26 @@ if __name__ == "__main__":
     parser.add_argument(
         "--version", default="R2013", help="DXF version for output (default: R2013)"
     )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="Number of converter processes to run at once (default: 1)",
+    )
+    parser.add_argument(
+        "--timeout", type=float,
+        help="Seconds a single file may take before it is abandoned",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Skip DWGs unchanged since the last run (manifest kept in DEST)",
+    )
+    parser.add_argument(
+        "--batch", type=int, default=1, metavar="N",
+        help="Convert N files per converter launch (default: 1)",
+    )
+    instrument.add_argument(parser)
     args = parser.parse_args()
-    convert_directory(args.src, args.dest, args.version)
+    instrument.from_args(args)
+    convert_directory(
+        args.src, args.dest, args.version, args.jobs, args.timeout,
+        args.incremental, args.batch,
+    )
@@ -0,0 +1,234 @@
+"""On-disk cache of parsed DXF documents.
+
+Parsing DXF text is the slowest part of every script that reads converted
+drawings; unpickling an already parsed :class:`ezdxf.document.Drawing` is
+an order of magnitude faster.  :func:`readfile` is a drop-in replacement
+for ``ezdxf.readfile`` that keeps a pickled copy of every document it
+parses::
+
+    from dxf_cache import readfile
+    doc = readfile("sheet.dxf")
+
+Entries are named after the SHA-256 of the file content and the ezdxf
+version, so a file is parsed again as soon as its content changes or ezdxf
+is upgraded.  An index maps every path to its size, mtime and hash, so the
+hash of an unchanged file is not computed again either.  Least recently
+used entries are evicted once the cache grows beyond its size cap.
+
+The cache lives in ``$DXF_CACHE_DIR`` (default ``~/.cache/dxf_cache``) and
+is capped at ``$DXF_CACHE_SIZE`` MiB (default 2048); ``DXF_CACHE=0``
+disables it::
+
+    python dxf_cache.py stats
+    python dxf_cache.py prune --size 512
+    python dxf_cache.py clear
+"""
+
+import argparse
+import json
+import os
+import pickle
+import threading
+
+import ezdxf
+
+from file_utils import file_hash, write_atomic, write_json_atomic
+
+INDEX_NAME = "index.json"
+ENTRY_SUFFIX = ".pickle"
+DEFAULT_SIZE_MB = 2048
+
+
+class DxfCache:
+    """Pickled documents in ``directory``, at most ``max_bytes`` in total.
+
+    Several processes may share a cache directory: entries and the index
+    are replaced atomically, and a lost index update only means a file is
+    hashed once more.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_SIZE_MB << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # index of path -> {"size", "mtime", "sha256"}
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(os.path.join(self.directory, INDEX_NAME), "r",
+                          encoding="utf-8") as fp:
+                    self._index = json.load(fp)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self) -> None:
+        write_json_atomic(os.path.join(self.directory, INDEX_NAME), self._index, sort_keys=True)
+
+    def _digest(self, path: str) -> str:
+        """Return the content hash of ``path``, reusing the indexed one."""
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            record = self._load_index().get(key)
+        if record and record["size"] == st.st_size and record["mtime"] == st.st_mtime_ns:
+            return record["sha256"]
+        digest = file_hash(path)
+        with self._lock:
+            self._index[key] = {
+                "size": st.st_size, "mtime": st.st_mtime_ns, "sha256": digest,
+            }
+            self._save_index()
+        return digest
+
+    def _entry_path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}-{ezdxf.__version__}{ENTRY_SUFFIX}")
+
+    # entries
+
+    def load_bytes(self, path: str) -> bytes:
+        """Return the pickled document of ``path``, parsing it on a miss."""
+        entry = self._entry_path(self._digest(path))
+        try:
+            with open(entry, "rb") as fp:
+                data = fp.read()
+        except OSError:
+            pass
+        else:
+            os.utime(entry)  # mark as recently used
+            return data
+        data = pickle.dumps(ezdxf.readfile(path), protocol=pickle.HIGHEST_PROTOCOL)
+        self._store(entry, data)
+        return data
+
+    def readfile(self, path: str):
+        """Return the parsed document of ``path`` like ``ezdxf.readfile``."""
+        doc = pickle.loads(self.load_bytes(path))
+        doc.filename = str(path)  # the entry may come from a copy elsewhere
+        return doc
+
+    def store(self, path: str, doc) -> None:
+        """Cache ``doc`` as the parsed content of ``path`` just written from it.
+
+        Saves the next reader of a file this process has written from
+        parsing it again.
+        """
+        data = pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store(self._entry_path(self._digest(path)), data)
+
+    def _store(self, entry: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        write_atomic(entry, data)
+        self.prune()
+
+    def entries(self) -> list:
+        """Return ``(last_used, size, path)`` of all entries, oldest first."""
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            result.append((st.st_mtime, st.st_size, path))
+        return sorted(result)
+
+    def prune(self, max_bytes: int = None) -> int:
+        """Delete least recently used entries above ``max_bytes``, return count."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """Delete all entries and the index, return the number of entries."""
+        removed = self.prune(0)
+        try:
+            os.unlink(os.path.join(self.directory, INDEX_NAME))
+        except OSError:
+            pass
+        self._index = None
+        return removed
+
+
+_default = None
+
+
+def default_cache():
+    """Return the process-wide cache configured by the environment or ``None``."""
+    global _default
+    if os.environ.get("DXF_CACHE", "1") == "0":
+        return None
+    if _default is None:
+        directory = os.environ.get("DXF_CACHE_DIR") or os.path.join(
+            os.path.expanduser("~"), ".cache", "dxf_cache"
+        )
+        size_mb = int(os.environ.get("DXF_CACHE_SIZE", DEFAULT_SIZE_MB))
+        _default = DxfCache(directory, size_mb << 20)
+    return _default
+
+
+def load_bytes(path) -> bytes:
+    """Return ``path`` parsed and pickled, through the default cache."""
+    cache = default_cache()
+    if cache is None:
+        return pickle.dumps(ezdxf.readfile(path), protocol=pickle.HIGHEST_PROTOCOL)
+    return cache.load_bytes(str(path))
+
+
+def readfile(path):
+    """``ezdxf.readfile`` through the default cache."""
+    cache = default_cache()
+    if cache is None:
+        return ezdxf.readfile(path)
+    return cache.readfile(str(path))
+
+
+def store(path, doc) -> None:
+    """Record ``doc`` as the parsed content of ``path`` in the default cache."""
+    cache = default_cache()
+    if cache is not None:
+        cache.store(str(path), doc)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clean the DXF cache")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    parser.add_argument(
+        "--size", type=int, metavar="MB",
+        help="Size cap in MiB for prune (default: $DXF_CACHE_SIZE or 2048)",
+    )
+    args = parser.parse_args()
+
+    cache = default_cache()
+    if cache is None:
+        print("DXF cache is disabled (DXF_CACHE=0)")
+    elif args.command == "stats":
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(
+            f"{cache.directory}: {len(entries)} entries, "
+            f"{total / 2**20:.1f} of {cache.max_bytes / 2**20:.0f} MiB"
+        )
+    elif args.command == "prune":
+        max_bytes = args.size << 20 if args.size is not None else None
+        print(f"Removed {cache.prune(max_bytes)} entries")
+    else:
+        print(f"Removed {cache.clear()} entries")
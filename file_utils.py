@@ -0,0 +1,69 @@
+"""File helpers shared by the conversion, merge and report scripts.
+
+:func:`file_hash` computes the SHA-256 of a file without reading it into
+memory at once, which is how manifests and caches tell changed files
+apart.  :func:`write_atomic`, :func:`write_json_atomic` and
+:func:`copy_atomic` write through a temporary file in the target directory
+and then replace the target, so an interrupted run leaves either the old
+or the new file but never a truncated one.  Temporary files start with ``.`` and end in ``.tmp``, so
+scripts that scan a directory for ``*.dwg`` or ``*.dxf`` skip leftovers.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import instrument
+
+
+def file_hash(path) -> str:
+    """Return the SHA-256 hex digest of ``path``."""
+    digest = hashlib.sha256()
+    with instrument.span("hash", file=os.path.basename(path)), open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def temp_path(path) -> str:
+    """Create an empty temporary file next to ``path`` and return its name."""
+    fd, tmp = tempfile.mkstemp(
+        prefix=".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path))
+    )
+    os.close(fd)
+    return tmp
+
+
+def write_atomic(path, data: bytes) -> None:
+    """Replace ``path`` with ``data``."""
+    tmp = temp_path(path)
+    try:
+        with open(tmp, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def write_json_atomic(path, data, **kwargs) -> None:
+    """Replace ``path`` with ``data`` as UTF-8 JSON.
+
+    ``kwargs`` are passed on to :func:`json.dumps`; non-ASCII text is kept
+    as it is.
+    """
+    text = json.dumps(data, ensure_ascii=False, **kwargs)
+    write_atomic(path, text.encode("utf-8"))
+
+
+def copy_atomic(src, dest) -> None:
+    """Copy ``src`` with its metadata onto ``dest`` like ``shutil.copy2``."""
+    tmp = temp_path(dest)
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        os.unlink(tmp)
+        raise
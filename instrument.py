@@ -0,0 +1,194 @@
+"""Per-stage timing and memory trace for the CAD scripts.
+
+The collect, convert, merge and block scripts wrap their stages in
+:func:`span`::
+
+    with instrument.span("read", file=name) as s:
+        doc = readfile(path)
+        s.set(entities=len(doc.modelspace()))
+
+Tracing is off unless a script is started with ``--trace FILE`` (or
+``$CAD_TRACE`` is set); ``span`` then returns a shared no-op object.  When
+on, every span is written as a Chrome trace event carrying the stage
+name, wall time, the fields given to it and the peak RSS of the process.
+A ``.json`` trace file is a Chrome trace array that opens in
+``chrome://tracing`` or Perfetto, any other name gets one JSON event per
+line.  Worker processes inherit ``$CAD_TRACE`` and append to the same file::
+
+    python merge_dxf.py merged.dxf -f dxfs -j 4 --trace merge.jsonl
+    python instrument.py merge.jsonl
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+ENV_VAR = "CAD_TRACE"
+
+_fd = None
+_path = None
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if os.uname().sysname == "Darwin" else 2**10), 1)
+
+
+def enable(path: str) -> None:
+    """Start a new trace in ``path`` for this process and its children."""
+    global _fd, _path
+    chrome = path.endswith(".json")
+    with open(path, "w", encoding="utf-8") as fp:
+        if chrome:
+            fp.write("[\n")  # the closing bracket is optional in Chrome traces
+    os.environ[ENV_VAR] = os.path.abspath(path)
+    if _fd is not None:
+        os.close(_fd)
+    _fd = None
+    _path = None
+
+
+def _sink():
+    """Return the trace file descriptor, opened from ``$CAD_TRACE`` once."""
+    global _fd, _path
+    path = os.environ.get(ENV_VAR)
+    if not path:
+        return None
+    if _fd is None or _path != path:
+        _fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        _path = path
+    return _fd
+
+
+def _emit(event: dict) -> None:
+    fd = _sink()
+    if fd is None:
+        return
+    line = json.dumps(event, ensure_ascii=False, default=str)
+    if _path.endswith(".json"):
+        line += ","
+    # single appending write per event, so processes do not interleave lines
+    os.write(fd, (line + "\n").encode("utf-8"))
+
+
+class _Span:
+    __slots__ = ("name", "args", "_ts", "_start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def set(self, **fields) -> None:
+        """Attach ``fields`` such as entity counts to the span."""
+        self.args.update(fields)
+
+    def __enter__(self):
+        self._ts = time.time_ns() // 1000
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.args["peak_rss_mb"] = _peak_rss_mb()
+        _emit({
+            "name": self.name,
+            "cat": "cad",
+            "ph": "X",
+            "ts": self._ts,
+            "dur": round(seconds * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident() % 100000,
+            "args": self.args,
+        })
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **fields) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **fields):
+    """Return a context manager timing stage ``name`` of the current file."""
+    if not os.environ.get(ENV_VAR):
+        return _NULL_SPAN
+    return _Span(name, fields)
+
+
+def add_argument(parser) -> None:
+    """Add the ``--trace FILE`` option to an argparse ``parser``."""
+    parser.add_argument(
+        "--trace", metavar="FILE",
+        help="Record per-file stage timings and memory (.json: Chrome trace, "
+             "otherwise JSON lines)",
+    )
+
+
+def from_args(args) -> None:
+    """Enable tracing if ``--trace`` was given."""
+    if getattr(args, "trace", None):
+        enable(args.trace)
+
+
+def load(path: str) -> list:
+    """Read the events of a trace written in either format."""
+    events = []
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            line = line.strip().rstrip(",")
+            if line and line not in ("[", "]"):
+                events.append(json.loads(line))
+    return events
+
+
+def summarize(events: list, top: int = 5) -> None:
+    """Print wall time per stage and the slowest files."""
+    stages = defaultdict(lambda: [0, 0.0])
+    peak = 0.0
+    for event in events:
+        stage = stages[event["name"]]
+        stage[0] += 1
+        stage[1] += event["dur"] / 1e6
+        peak = max(peak, event["args"].get("peak_rss_mb") or 0.0)
+    print(f"{'stage':<20}{'count':>8}{'seconds':>12}{'mean ms':>12}")
+    for name, (count, seconds) in sorted(stages.items(), key=lambda kv: -kv[1][1]):
+        print(f"{name:<20}{count:>8}{seconds:>12.3f}{seconds / count * 1000:>12.2f}")
+    slowest = sorted(
+        (e for e in events if "file" in e["args"]), key=lambda e: -e["dur"]
+    )[:top]
+    if slowest:
+        print("slowest:")
+        for e in slowest:
+            entities = e["args"].get("entities")
+            suffix = f", {entities} entities" if entities is not None else ""
+            print(f"  {e['name']} {e['args']['file']}: {e['dur'] / 1e6:.3f}s{suffix}")
+    print(f"peak RSS {peak:.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a CAD script trace")
+    parser.add_argument("trace", help="Trace file written with --trace")
+    parser.add_argument("--top", type=int, default=5, help="Slowest files to list")
+    args = parser.parse_args()
+    summarize(load(args.trace), args.top)
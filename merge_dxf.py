@@ -1,19 +1,18 @@
 import argparse
-import ezdxf
-from ezdxf.addons import Importer
-from ezdxf.document import Drawing
+import os
 from pathlib import Path
 
+import instrument
+from merge_engine import STRATEGIES, merge_files
+from merge_filter import EntityFilter
+from merge_simplify import GeometrySimplifier
 
-def _reset_insbase(doc: Drawing) -> None:
-    """Set INSBASE of *doc* to (0, 0, 0) to avoid automatic offsets."""
-    try:
-        doc.header["$INSBASE"] = (0, 0, 0)
-    except Exception:
-        pass
 
-
-def merge_from_folder(folder_path: str, output: str) -> None:
+def merge_from_folder(folder_path: str, output: str, jobs: int = 1,
+                      stream: bool = False, strategy: str = "importer",
+                      index: str = None, binary: bool = False,
+                      entity_filter: EntityFilter = None, prune: bool = False,
+                      simplifier: GeometrySimplifier = None) -> None:
     """Merge all DXF files from a folder into a single output DXF."""
     folder = Path(folder_path)
     
@@ -34,51 +33,90 @@ def merge_from_folder(folder_path: str, output: str) -> None:
     
     print(f"Found {len(dxf_files)} DXF files to merge")
     
-    merged = ezdxf.new()
-    msp = merged.modelspace()
-    
-    merged_count = 0
-    for dxf_file in dxf_files:
-        try:
-            doc = ezdxf.readfile(dxf_file)
-        except Exception as e:
-            print(f"Failed to read {dxf_file}: {e}")
-            continue
-
-        _reset_insbase(doc)
-        importer = Importer(doc, merged)
-        importer.import_modelspace(msp)
-        importer.finalize()
-        print(f"Merged {dxf_file.name}")
-        merged_count += 1
-    
-    if merged_count > 0:
-        merged.saveas(output)
-        print(f"Successfully merged {merged_count} files into {output}")
+    stats = merge_files(
+        dxf_files, output, strategy, jobs, stream, index=index, binary=binary,
+        entity_filter=entity_filter, prune=prune, simplifier=simplifier,
+    )
+    if stats["files"] > 0:
+        _print_filter_summary(stats)
+        _print_vertex_summary(stats)
+        print(f"Successfully merged {stats['files']} files into {output}")
     else:
         print("No files were successfully merged")
 
 
-def merge(files, output: str) -> None:
-    """Merge all entities from ``files`` into ``output`` DXF."""
+def merge(files, output: str, jobs: int = 1, stream: bool = False,
+          strategy: str = "importer", index: str = None,
+          binary: bool = False, entity_filter: EntityFilter = None,
+          prune: bool = False, simplifier: GeometrySimplifier = None) -> None:
+    """Merge all entities from ``files`` into ``output`` DXF.
+
+    ``jobs > 1`` parses the sources in worker processes; ``stream`` spools
+    the merged entities to disk so memory follows the largest input.
+    ``strategy`` selects the merge strategy of :mod:`merge_engine` and
+    ``index`` names a spatial index file to write alongside the output and
+    ``binary`` writes the output as binary DXF.  Only entities selected by
+    ``entity_filter`` are merged and ``prune`` drops unused blocks, layers
+    and text styles.  ``simplifier`` quantizes and simplifies the merged
+    geometry.
+    """
     if not files:
         print("No DXF files supplied")
         return
-    merged = ezdxf.new()
-    msp = merged.modelspace()
-    for f in files:
-        try:
-            doc = ezdxf.readfile(f)
-        except Exception as e:
-            print(f"Failed to read {f}: {e}")
-            continue
-        _reset_insbase(doc)
-        importer = Importer(doc, merged)
-        importer.import_modelspace(msp)
-        importer.finalize()
-        print(f"Merged {f}")
-    merged.saveas(output)
-    print(f"Written merged file to {output}")
+    stats = merge_files(
+        files, output, strategy, jobs, stream, index=index, binary=binary,
+        entity_filter=entity_filter, prune=prune, simplifier=simplifier,
+    )
+    if stats["files"] > 0:
+        _print_filter_summary(stats)
+        _print_vertex_summary(stats)
+        print(f"Written merged file to {output}")
+    else:
+        print("No files were successfully merged")
+
+
+def _print_filter_summary(stats: dict) -> None:
+    if stats["filtered"]:
+        print(f"Filtered out {stats['filtered']} entities")
+    pruned = stats.get("pruned")
+    if pruned:
+        print(
+            f"Pruned {pruned['blocks']} blocks, {pruned['layers']} layers "
+            f"and {pruned['styles']} text styles"
+        )
+
+
+def _print_vertex_summary(stats: dict) -> None:
+    vertices = stats.get("vertices")
+    if not vertices:
+        return
+    for name, (before, after) in vertices.items():
+        if before:
+            print(f"{name}: {before} -> {after} polyline vertices (-{1 - after / before:.0%})")
+    before = sum(b for b, _ in vertices.values())
+    after = sum(a for _, a in vertices.values())
+    if before:
+        print(f"Polyline vertices: {before} -> {after} (-{1 - after / before:.0%})")
+
+
+def merge_streaming(files, output: str) -> None:
+    """Merge ``files`` into ``output`` without keeping the merged modelspace.
+
+    Only one source document is loaded at a time and its entities are
+    spooled to disk right after import, so peak memory follows the largest
+    input instead of the sum of all inputs.
+    """
+    merge(files, output, stream=True)
+
+
+def merge_parallel(files, output: str, jobs: int = None) -> None:
+    """Merge ``files`` into ``output`` parsing the sources in ``jobs`` processes.
+
+    The main process assembles the parsed documents in input order, so the
+    result matches the serial merge apart from the time stamps and GUIDs
+    ezdxf writes into every header.
+    """
+    merge(files, output, jobs=jobs or os.cpu_count() or 1)
 
 
 if __name__ == "__main__":
@@ -88,11 +126,88 @@ if __name__ == "__main__":
     # 添加互斥参数组
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument("-f", "--folder", help="Folder containing DXF files to merge")
-    input_group.add_argument("files", nargs="*", help="Individual DXF files to merge")
+    input_group.add_argument("files", nargs="*", default=[], help="Individual DXF files to merge")
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="Stream entities to disk so memory follows the largest input",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="Parse source files in this many worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--strategy", choices=sorted(STRATEGIES), default="importer",
+        help="How source content is merged (default: importer)",
+    )
+    parser.add_argument(
+        "--index", metavar="FILE",
+        help="Write a spatial index of entity bounding boxes per source file",
+    )
+    parser.add_argument(
+        "--binary", action="store_true",
+        help="Write the merged file as binary DXF (smaller, faster to load)",
+    )
+    filters = parser.add_argument_group("filters")
+    filters.add_argument(
+        "--layers", nargs="+", metavar="GLOB",
+        help="Only merge entities on layers matching one of these globs",
+    )
+    filters.add_argument(
+        "--exclude-layers", nargs="+", metavar="GLOB",
+        help="Skip entities on layers matching one of these globs",
+    )
+    filters.add_argument(
+        "--types", nargs="+", metavar="TYPE",
+        help="Only merge these entity types, e.g. LINE LWPOLYLINE TEXT",
+    )
+    filters.add_argument(
+        "--exclude-types", nargs="+", metavar="TYPE", help="Skip these entity types"
+    )
+    filters.add_argument(
+        "--clip", nargs=4, type=float, metavar=("MINX", "MINY", "MAXX", "MAXY"),
+        help="Only merge entities overlapping this box",
+    )
+    filters.add_argument(
+        "--visible-only", action="store_true",
+        help="Skip entities on frozen or switched off layers",
+    )
+    filters.add_argument(
+        "--prune", action="store_true",
+        help="Drop blocks, layers and text styles no merged entity uses",
+    )
+    geometry = parser.add_argument_group("geometry")
+    geometry.add_argument(
+        "--quantize", type=float, metavar="STEP",
+        help="Snap coordinates to multiples of STEP drawing units",
+    )
+    geometry.add_argument(
+        "--simplify", type=float, metavar="TOL",
+        help="Drop polyline vertices deviating less than TOL from the simplified line",
+    )
+    instrument.add_argument(parser)
     
     args = parser.parse_args()
+    instrument.from_args(args)
+    entity_filter = None
+    if (
+        args.layers or args.exclude_layers or args.types or args.exclude_types
+        or args.clip or args.visible_only
+    ):
+        entity_filter = EntityFilter(
+            args.layers, args.exclude_layers, args.types, args.exclude_types,
+            args.clip, args.visible_only,
+        )
+    simplifier = None
+    if args.quantize or args.simplify:
+        simplifier = GeometrySimplifier(args.quantize, args.simplify)
     
     if args.folder:
-        merge_from_folder(args.folder, args.output)
+        merge_from_folder(
+            args.folder, args.output, args.jobs, args.stream, args.strategy,
+            args.index, args.binary, entity_filter, args.prune, simplifier,
+        )
     else:
-        merge(args.files, args.output)
+        merge(
+            args.files, args.output, args.jobs, args.stream, args.strategy,
+            args.index, args.binary, entity_filter, args.prune, simplifier,
+        )
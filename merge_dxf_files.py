@@ -1,121 +1,61 @@
+import json
 import os
 import ezdxf
-from ezdxf.math import Vec3
 
-def merge_dxf_files(source_directory, output_file):
+import dxf_cache
+import instrument
+from file_utils import file_hash, write_json_atomic
+from merge_engine import CopyStrategy, LayerStrategy, ResourceCache, merge_files
+from merge_filter import UsageTracker
+
+# 增量合并时用于标记实体来源文件的 XDATA 应用名
+SOURCE_APPID = "MERGE_SOURCE"
+
+
+def _report(name, count, error):
+    """合并引擎的进度输出"""
+    if error is not None:
+        print(f"  错误: 无法处理文件 {name}: {error}")
+    else:
+        print(f"正在处理: {name}\n  成功复制 {count} 个实体")
+
+
+def _dxf_paths(source_directory):
+    return [
+        os.path.join(source_directory, f)
+        for f in os.listdir(source_directory) if f.lower().endswith('.dxf')
+    ]
+
+
+def merge_dxf_files(source_directory, output_file, binary=False):
     """
     将指定目录下的所有DXF文件内容原位粘贴到一个新的DXF文件中
     
     Args:
         source_directory: 源DXF文件目录
         output_file: 输出的合并DXF文件路径
+        binary: 是否保存为二进制DXF（文件更小，读写更快）
     """
-    # 创建新的DXF文档
-    merged_doc = ezdxf.new()
-    merged_msp = merged_doc.modelspace()
-    
-    # 用于存储所有已处理的块定义，避免重复
-    processed_blocks = set()
-    
     print(f"开始合并目录 {source_directory} 下的所有DXF文件...")
     
-    dxf_files = [f for f in os.listdir(source_directory) if f.lower().endswith('.dxf')]
+    dxf_files = _dxf_paths(source_directory)
     
     if not dxf_files:
         print("未找到任何DXF文件!")
         return
     
-    for filename in dxf_files:
-        file_path = os.path.join(source_directory, filename)
-        print(f"正在处理: {filename}")
-        
-        try:
-            # 读取源DXF文件
-            source_doc = ezdxf.readfile(file_path)
-            source_msp = source_doc.modelspace()
-            
-            # 复制块定义（避免重复）
-            for block_name, block in source_doc.blocks.items():
-                if block_name not in processed_blocks and not block_name.startswith('*'):
-                    try:
-                        # 在目标文档中创建新块
-                        new_block = merged_doc.blocks.new(name=block_name)
-                        
-                        # 复制块中的所有实体
-                        for entity in block:
-                            new_block.add_entity(entity.copy())
-                        
-                        processed_blocks.add(block_name)
-                    except ezdxf.DXFValueError:
-                        # 块名已存在，跳过
-                        pass
-            
-            # 复制图层定义
-            for layer_name, layer in source_doc.layers.items():
-                if layer_name not in merged_doc.layers:
-                    new_layer = merged_doc.layers.new(name=layer_name)
-                    # 复制图层属性
-                    new_layer.color = layer.color
-                    new_layer.linetype = layer.linetype
-                    new_layer.lineweight = layer.lineweight
-                    new_layer.transparency = layer.transparency
-                    new_layer.on = layer.on
-                    new_layer.freeze = layer.freeze
-                    new_layer.lock = layer.lock
-            
-            # 复制线型定义
-            for linetype_name, linetype in source_doc.linetypes.items():
-                if linetype_name not in merged_doc.linetypes and linetype_name not in ['ByLayer', 'ByBlock']:
-                    try:
-                        merged_doc.linetypes.new(
-                            name=linetype_name,
-                            dxfattribs={'description': linetype.dxf.description}
-                        )
-                    except:
-                        pass
-            
-            # 复制文字样式
-            for style_name, style in source_doc.styles.items():
-                if style_name not in merged_doc.styles:
-                    try:
-                        merged_doc.styles.new(
-                            name=style_name,
-                            dxfattribs={
-                                'font': style.dxf.font,
-                                'width': style.dxf.width,
-                                'height': style.dxf.height,
-                                'oblique': style.dxf.oblique
-                            }
-                        )
-                    except:
-                        pass
-            
-            # 复制所有模型空间实体（原位粘贴）
-            entity_count = 0
-            for entity in source_msp:
-                try:
-                    # 直接复制实体，保持原始坐标
-                    new_entity = entity.copy()
-                    merged_msp.add_entity(new_entity)
-                    entity_count += 1
-                except Exception as e:
-                    print(f"  警告: 无法复制实体 {entity.dxftype()}: {e}")
-            
-            print(f"  成功复制 {entity_count} 个实体")
-            
-        except Exception as e:
-            print(f"  错误: 无法处理文件 {filename}: {e}")
-            continue
-    
-    # 保存合并后的文件
+    # 复制块、图层、线型、文字样式和模型空间实体（原位粘贴）
     try:
-        merged_doc.saveas(output_file)
+        merge_files(
+            dxf_files, output_file, CopyStrategy(), report=_report, binary=binary
+        )
         print(f"\n合并完成! 输出文件: {output_file}")
         print(f"总共处理了 {len(dxf_files)} 个DXF文件")
     except Exception as e:
         print(f"保存文件时出错: {e}")
 
-def merge_dxf_with_layers(source_directory, output_file, use_filename_as_layer=True):
+def merge_dxf_with_layers(source_directory, output_file, use_filename_as_layer=True,
+                          binary=False):
     """
     将DXF文件合并，可选择是否将文件名作为图层名
     
@@ -123,52 +63,112 @@ def merge_dxf_with_layers(source_directory, output_file, use_filename_as_layer=T
         source_directory: 源DXF文件目录
         output_file: 输出文件路径
         use_filename_as_layer: 是否将文件名作为图层名
+        binary: 是否保存为二进制DXF
     """
-    merged_doc = ezdxf.new()
-    merged_msp = merged_doc.modelspace()
-    processed_blocks = set()
-    
     print(f"开始合并目录 {source_directory} 下的所有DXF文件...")
     
-    dxf_files = [f for f in os.listdir(source_directory) if f.lower().endswith('.dxf')]
-    
-    for filename in dxf_files:
+    strategy = LayerStrategy() if use_filename_as_layer else CopyStrategy()
+    merge_files(
+        _dxf_paths(source_directory), output_file, strategy, report=_report,
+        binary=binary,
+    )
+    print(f"\n合并完成! 输出文件: {output_file}")
+
+
+def merge_dxf_incremental(source_directory, output_file, manifest_file=None,
+                          binary=False):
+    """
+    增量合并：只重新合并发生变化或被删除的源文件
+
+    每个合并进来的实体都带有 XDATA（应用名 ``MERGE_SOURCE``），记录其来源文件名；
+    清单文件记录每个源文件的大小、修改时间和 SHA-256。再次运行时只删除并重新复制
+    内容有变化的文件对应的实体，删除已不存在的源文件的实体，其余内容原样保留，
+    不必重新读取所有源 DXF。删除旧实体后，不再被引用的块定义也会一并删除。
+
+    Args:
+        source_directory: 源DXF文件目录
+        output_file: 输出的合并DXF文件路径
+        manifest_file: 清单文件路径，默认为 ``<output_file>.manifest.json``
+        binary: 是否保存为二进制DXF，已有的合并结果无论哪种格式都能读取
+
+    Returns:
+        (更新的文件数, 删除的文件数)
+    """
+    manifest_file = manifest_file or output_file + '.manifest.json'
+    manifest = {}
+    merged_doc = None
+    if os.path.exists(output_file) and os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as fp:
+                manifest = json.load(fp)
+            merged_doc = dxf_cache.readfile(output_file)
+        except Exception as e:
+            print(f"无法读取已有的合并结果，将完整重建: {e}")
+            manifest, merged_doc = {}, None
+    if merged_doc is None:
+        merged_doc = ezdxf.new()
+    if SOURCE_APPID not in merged_doc.appids:
+        merged_doc.appids.new(SOURCE_APPID)
+    merged_msp = merged_doc.modelspace()
+    strategy = CopyStrategy()
+
+    # 根据大小、修改时间和内容摘要找出变化的源文件
+    current = {}
+    changed = []
+    for filename in sorted(os.listdir(source_directory)):
+        if not filename.lower().endswith('.dxf'):
+            continue
+        st = os.stat(os.path.join(source_directory, filename))
+        record = {'size': st.st_size, 'mtime': st.st_mtime_ns}
+        old = manifest.get(filename)
+        if old and old['size'] == st.st_size and old['mtime'] == st.st_mtime_ns:
+            record['sha256'] = old['sha256']
+        else:
+            record['sha256'] = file_hash(os.path.join(source_directory, filename))
+        current[filename] = record
+        if not old or old['sha256'] != record['sha256']:
+            changed.append(filename)
+    removed = [name for name in manifest if name not in current]
+
+    # 删除变化或已删除的源文件对应的旧实体
+    stale = set(changed) | set(removed)
+    if stale:
+        for entity in list(merged_msp):
+            if not entity.has_xdata(SOURCE_APPID):
+                continue
+            tags = entity.get_xdata(SOURCE_APPID)
+            if tags and tags[0].value in stale:
+                merged_msp.delete_entity(entity)
+        # 删除不再被引用的块定义，避免变化的源文件的旧块（及其 NAME_<hash8> 副本）不断累积
+        pruned = UsageTracker().prune_blocks(merged_doc)
+        if pruned:
+            print(f"已删除 {pruned} 个不再使用的块定义")
+    cache = ResourceCache(merged_doc)
+    for filename in removed:
+        print(f"已移除: {filename}")
+
+    for filename in changed:
         file_path = os.path.join(source_directory, filename)
         print(f"正在处理: {filename}")
-        
         try:
-            source_doc = ezdxf.readfile(file_path)
-            source_msp = source_doc.modelspace()
-            
-            # 如果使用文件名作为图层，创建以文件名命名的图层
-            layer_name = None
-            if use_filename_as_layer:
-                layer_name = os.path.splitext(filename)[0]
-                if layer_name not in merged_doc.layers:
-                    merged_doc.layers.new(name=layer_name)
-            
-            # 复制必要的定义（块、图层、线型等）
-            # ... (同上面的代码)
-            
-            # 复制实体并设置图层
-            entity_count = 0
-            for entity in source_msp:
-                try:
-                    new_entity = entity.copy()
-                    if use_filename_as_layer:
-                        new_entity.dxf.layer = layer_name
-                    merged_msp.add_entity(new_entity)
-                    entity_count += 1
-                except Exception as e:
-                    print(f"  警告: 无法复制实体: {e}")
-            
-            print(f"  成功复制 {entity_count} 个实体到图层 {layer_name if use_filename_as_layer else '原图层'}")
-            
+            with instrument.span('read', file=filename):
+                source_doc = dxf_cache.readfile(file_path)
+            with instrument.span('merge', file=filename) as span:
+                new_entities = strategy.merge(source_doc, merged_msp, cache, filename)
+                span.set(entities=len(new_entities))
+            for entity in new_entities:
+                entity.set_xdata(SOURCE_APPID, [(1000, filename)])
+            print(f"  成功复制 {len(new_entities)} 个实体")
         except Exception as e:
             print(f"  错误: 无法处理文件 {filename}: {e}")
-    
-    merged_doc.saveas(output_file)
-    print(f"\n合并完成! 输出文件: {output_file}")
+            current.pop(filename)
+
+    with instrument.span('save', file=os.path.basename(output_file)):
+        merged_doc.saveas(output_file, fmt='bin' if binary else 'asc')
+    write_json_atomic(manifest_file, current, indent=1, sort_keys=True)
+    print(f"\n增量合并完成! 更新 {len(changed)} 个文件, 移除 {len(removed)} 个文件")
+    return len(changed), len(removed)
+
 
 if __name__ == '__main__':
     # 设置源目录和输出文件
@@ -179,4 +179,7 @@ if __name__ == '__main__':
     merge_dxf_files(source_dir, output_path)
     
     # 方式2: 合并时将每个文件的内容放到以文件名命名的图层中
-    # merge_dxf_with_layers(source_dir, output_path, use_filename_as_layer=True)
\ No newline at end of file
+    # merge_dxf_with_layers(source_dir, output_path, use_filename_as_layer=True)
+
+    # 方式3: 增量合并，只更新发生变化的源文件
+    # merge_dxf_incremental(source_dir, output_path)
\ No newline at end of file
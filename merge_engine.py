@@ -0,0 +1,571 @@
+"""Shared DXF merge engine.
+
+``merge_dxf.py``, ``merge_dxf_files.py`` and ``fixed_merge_dxf_Version2.py``
+are front-ends for :func:`merge_files`.  How the content of one source
+document gets into the merged document is decided by a strategy:
+
+- ``"importer"``: :class:`ezdxf.addons.Importer`, which also resolves
+  anonymous blocks and renames conflicting block definitions.
+- ``"copy"``: raw entity copy, the definitions (linetypes, text styles,
+  layers and blocks) are copied through a :class:`ResourceCache`.
+- ``"layer"``: like ``"copy"`` but every entity is placed on a layer named
+  after its source file.
+
+The :class:`ResourceCache` knows every table entry and block name of the
+merged document, so each definition is looked up and copied once per merge
+instead of once per source file.
+
+Sources may be ASCII or binary DXF, ``ezdxf.readfile`` detects the format;
+``binary=True`` writes the merged document as binary DXF.  Sources are read
+through :mod:`dxf_cache`, so merging the same files again skips parsing.
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import ezdxf
+from ezdxf import bbox
+from ezdxf.addons import Importer
+from ezdxf.document import Drawing
+from ezdxf.lldxf.tagwriter import BinaryTagWriter, TagCollector, TagWriter
+
+import dxf_cache
+import instrument
+from merge_filter import EntityFilter, UsageTracker
+from merge_simplify import GeometrySimplifier
+from spatial_index import SpatialIndex, index_entities
+
+# handle attributes which are only valid inside the source document
+_DROP_ATTRIBS = {
+    "handle", "owner", "name", "plotstyle_handle", "material_handle", "unknown1",
+}
+
+
+# group codes of handles and pointers, they differ between identical blocks
+_POINTER_CODES = (
+    {5, 105, 1005} | set(range(320, 370)) | set(range(390, 400)) | {480, 481}
+)
+
+
+def block_fingerprint(block, mapping: dict = None) -> str:
+    """Return a SHA-256 over the canonical content of a block definition.
+
+    The base point and the DXF tags of all block entities are hashed with
+    handles and owner pointers left out, so identical definitions from
+    different documents get the same fingerprint.  Names of nested INSERTs
+    are translated through ``mapping`` first.
+    """
+    mapping = mapping or {}
+    digest = hashlib.sha256(repr(tuple(block.block.dxf.base_point)).encode())
+    for entity in block:
+        collector = TagCollector(dxfversion=block.doc.dxfversion)
+        entity.export_dxf(collector)
+        nested = entity.dxf.name if entity.dxftype() == "INSERT" else None
+        for tag in collector.tags:
+            if tag.code in _POINTER_CODES:
+                continue
+            value = tag.value
+            if nested is not None and tag.code == 2 and value == nested:
+                value = mapping.get(value, value)
+            digest.update(f"{tag.code}\x1f{value!r}\x1e".encode("utf8"))
+    return digest.hexdigest()
+
+
+def remap_inserts(entities, mapping: dict) -> None:
+    """Point INSERTs in ``entities`` to the block names given by ``mapping``."""
+    for entity in entities:
+        if entity.dxftype() == "INSERT":
+            name = entity.dxf.name
+            if mapping.get(name, name) != name:
+                entity.dxf.name = mapping[name]
+
+
+def reset_insbase(doc: Drawing) -> None:
+    """Set INSBASE of *doc* to (0, 0, 0) to avoid automatic offsets."""
+    try:
+        doc.header["$INSBASE"] = (0, 0, 0)
+    except Exception:
+        pass
+
+
+class ResourceCache:
+    """Names of the table entries and blocks present in the merged document.
+
+    DXF table names are case-insensitive, so all names are stored lower
+    case.  A definition whose name is already known is skipped without
+    touching the target tables.  Blocks are additionally registered by
+    their :func:`block_fingerprint`: an identical definition is shared
+    instead of copied again, and a different definition with a name that
+    is already taken gets the first eight fingerprint digits appended.
+    Blocks inserted directly into a source's modelspace, such as the
+    per-file blocks of ``batch_block_by_filename``, are only shared with an
+    identical definition of the same name, so the merged drawing still
+    tells which source every one of them came from.
+    """
+
+    def __init__(self, doc: Drawing):
+        self.doc = doc
+        self.linetypes = {e.dxf.name.lower() for e in doc.linetypes}
+        self.styles = {e.dxf.name.lower() for e in doc.styles}
+        self.layers = {e.dxf.name.lower() for e in doc.layers}
+        self.blocks = {b.name.lower() for b in doc.blocks}
+        self.fingerprints = {}
+        # (source block name, fingerprint) -> merged block name
+        self.variants = {}
+        for block in doc.blocks:
+            if not block.name.startswith("*"):
+                fingerprint = block_fingerprint(block)
+                self.fingerprints.setdefault(fingerprint, block.name)
+                self.variants.setdefault((block.name.lower(), fingerprint), block.name)
+                # a variant renamed by _free_name also stands for its base name
+                base = re.fullmatch(rf"(.+)_{fingerprint[:8]}(?:_\d+)?", block.name)
+                if base:
+                    self.variants.setdefault((base.group(1).lower(), fingerprint), block.name)
+
+    def add_layer(self, name: str, dxfattribs: dict = None) -> None:
+        """Create layer ``name`` in the merged document unless it exists."""
+        if name.lower() not in self.layers:
+            self.doc.layers.new(name, dxfattribs=dxfattribs)
+            self.layers.add(name.lower())
+
+    def copy_definitions(self, source: Drawing) -> dict:
+        """Copy linetypes, text styles, layers and blocks of ``source``.
+
+        Table entries already present in the merged document are kept as
+        they are; anonymous blocks (``*U``, ``*D`` ...) are not copied
+        because their names are only unique within one document.  Returns
+        the mapping of source block names to merged block names.
+        """
+        for linetype in source.linetypes:
+            name = linetype.dxf.name
+            if name.lower() in self.linetypes:
+                continue
+            self.doc.linetypes.add(
+                name,
+                pattern=list(linetype.simplified_line_pattern()) or [0.0],
+                description=linetype.dxf.get("description", ""),
+            )
+            self.linetypes.add(name.lower())
+
+        for style in source.styles:
+            name = style.dxf.name
+            if not name or name.lower() in self.styles:
+                continue
+            self.doc.styles.new(name, dxfattribs=style.dxfattribs(drop=_DROP_ATTRIBS))
+            self.styles.add(name.lower())
+
+        for layer in source.layers:
+            name = layer.dxf.name
+            if name.lower() in self.layers:
+                continue
+            attribs = layer.dxfattribs(drop=_DROP_ATTRIBS)
+            if attribs.get("linetype", "").lower() not in self.linetypes:
+                attribs.pop("linetype", None)
+            self.doc.layers.new(name, dxfattribs=attribs)
+            self.layers.add(name.lower())
+
+        def copy(name, block, fingerprint):
+            target = self._free_name(name, fingerprint)
+            self.copy_block(block, target, mapping)
+            return target
+
+        mapping = {}
+        direct = {
+            insert.dxf.name: insert.dxf.name
+            for insert in source.modelspace().query("INSERT")
+        }
+        self._resolve_blocks(source.blocks, mapping, copy, direct)
+        return mapping
+
+    def dedup_blocks(self, names, direct: dict = None) -> dict:
+        """Fold blocks ``names`` just added to the merged document.
+
+        Blocks identical to an already registered definition are deleted and
+        INSERTs inside the remaining new blocks are remapped.  ``direct``
+        maps the new blocks inserted into the source's modelspace to their
+        names in the source.  Returns the mapping of the new names to the
+        names to use.
+        """
+        names = {name.lower() for name in names}
+        blocks = [b for b in self.doc.blocks if b.name.lower() in names]
+        mapping = {}
+        self._resolve_blocks(blocks, mapping, lambda name, block, fp: name, direct)
+        for block in blocks:
+            name = block.name
+            if mapping.get(name, name) != name:
+                self.doc.blocks.delete_block(name, safe=False)
+                self.blocks.discard(name.lower())
+            else:
+                remap_inserts(block, mapping)
+        return mapping
+
+    def _resolve_blocks(self, blocks, mapping: dict, add, direct: dict = None) -> None:
+        """Map every non-anonymous block in ``blocks`` to a registered block.
+
+        Nested blocks are resolved first so their final names enter the
+        fingerprint.  ``add(name, block, fingerprint)`` is called for
+        definitions not seen before and returns the name they are kept as.
+        Blocks in ``direct``, which maps them to their source names, are
+        only resolved to a block registered under the same source name.
+        """
+        direct = direct or {}
+        by_name = {b.name: b for b in blocks if not b.name.startswith("*")}
+
+        def resolve(name, visiting):
+            if name in mapping or name not in by_name or name in visiting:
+                return
+            visiting.add(name)
+            block = by_name[name]
+            for insert in block.query("INSERT"):
+                resolve(insert.dxf.name, visiting)
+            fingerprint = block_fingerprint(block, mapping)
+            variant = (direct.get(name, name).lower(), fingerprint)
+            if name in direct:
+                target = self.variants.get(variant)
+            else:
+                target = self.fingerprints.get(fingerprint)
+            if target is None:
+                target = add(name, block, fingerprint)
+                self.fingerprints.setdefault(fingerprint, target)
+            self.variants.setdefault(variant, target)
+            mapping[name] = target
+
+        for name in by_name:
+            resolve(name, set())
+
+    def _free_name(self, name: str, fingerprint: str) -> str:
+        """Return ``name`` or a deterministic variant not used yet."""
+        if name.lower() not in self.blocks:
+            return name
+        candidate = f"{name}_{fingerprint[:8]}"
+        counter = 1
+        while candidate.lower() in self.blocks:
+            candidate = f"{name}_{fingerprint[:8]}_{counter}"
+            counter += 1
+        return candidate
+
+    def copy_block(self, block, name: str, mapping: dict = None):
+        """Copy the block layout ``block`` into the merged document as ``name``."""
+        new_block = self.doc.blocks.new(name, base_point=block.block.dxf.base_point)
+        self.blocks.add(name.lower())
+        for entity in block:
+            try:
+                new_entity = entity.copy()
+                remap_inserts([new_entity], mapping or {})
+                new_block.add_entity(new_entity)
+            except Exception as e:
+                print(f"  Warning: cannot copy block entity {entity.dxftype()}: {e}")
+        return new_block
+
+
+class ImporterStrategy:
+    """Merge by :class:`ezdxf.addons.Importer`.
+
+    The Importer resolves the resources used by the imported entities on its
+    own and renames conflicting blocks; the blocks it adds are then folded
+    into identical existing definitions through the :class:`ResourceCache`.
+    """
+
+    def merge(self, source: Drawing, msp, cache: ResourceCache, name: str,
+              entities=None) -> list:
+        reset_insbase(source)
+        start = len(msp)
+        importer = Importer(source, cache.doc)
+        with instrument.span("import_entities", file=name):
+            if entities is None:
+                importer.import_modelspace(msp)
+            else:
+                importer.import_entities(entities, msp)
+        with instrument.span("import_definitions", file=name):
+            importer.finalize()
+        added = [b.name for b in cache.doc.blocks if b.name.lower() not in cache.blocks]
+        cache.blocks.update(name.lower() for name in added)
+        new_entities = list(msp.entity_space[start:])
+        # blocks the importer renamed are matched by their source name
+        source_names = {new: old for old, new in importer.imported_blocks.items()}
+        direct = {
+            e.dxf.name: source_names.get(e.dxf.name, e.dxf.name)
+            for e in new_entities if e.dxftype() == "INSERT"
+        }
+        with instrument.span("dedup_blocks", file=name, blocks=len(added)):
+            remap_inserts(new_entities, cache.dedup_blocks(added, direct))
+        return new_entities
+
+
+class CopyStrategy:
+    """Merge by copying the modelspace entities in place.
+
+    With ``definitions=False`` only the entities are copied and missing
+    layers, styles or blocks are left to the CAD application.
+    """
+
+    def __init__(self, definitions: bool = True):
+        self.definitions = definitions
+
+    def target_layer(self, name: str, cache: ResourceCache):
+        """Return the layer for entities of source ``name``, ``None`` keeps theirs."""
+        return None
+
+    def merge(self, source: Drawing, msp, cache: ResourceCache, name: str,
+              entities=None) -> list:
+        mapping = {}
+        if self.definitions:
+            with instrument.span("copy_definitions", file=name):
+                mapping = cache.copy_definitions(source)
+        layer = self.target_layer(name, cache)
+        new_entities = []
+        with instrument.span("copy_entities", file=name) as span:
+            if entities is None:
+                entities = source.modelspace()
+            for entity in entities:
+                try:
+                    new_entity = entity.copy()
+                    if layer is not None:
+                        new_entity.dxf.layer = layer
+                    remap_inserts([new_entity], mapping)
+                    msp.add_entity(new_entity)
+                except Exception as e:
+                    print(f"  Warning: cannot copy entity {entity.dxftype()}: {e}")
+                    continue
+                new_entities.append(new_entity)
+            span.set(entities=len(new_entities))
+        return new_entities
+
+
+class LayerStrategy(CopyStrategy):
+    """Copy entities onto a layer named after their source file."""
+
+    def target_layer(self, name: str, cache: ResourceCache):
+        layer = os.path.splitext(name)[0]
+        cache.add_layer(layer)
+        return layer
+
+
+STRATEGIES = {
+    "importer": ImporterStrategy,
+    "copy": CopyStrategy,
+    "layer": LayerStrategy,
+}
+
+
+def _print_report(name: str, count: int, error) -> None:
+    if error is not None:
+        print(f"Failed to read {name}: {error}")
+    else:
+        print(f"Merged {name} ({count} entities)")
+
+
+def _parse_source(path) -> tuple:
+    """Worker: parse one DXF and return it pickled as ``(data, error)``.
+
+    Unpickling a parsed document is far cheaper than parsing DXF text, so
+    the main process only pays for assembling.  A cached source is passed
+    on without being parsed at all.
+    """
+    try:
+        with instrument.span("read", file=Path(path).name):
+            return dxf_cache.load_bytes(path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _read_serial(files):
+    for f in files:
+        try:
+            with instrument.span("read", file=Path(f).name):
+                doc = dxf_cache.readfile(f)
+        except Exception as e:
+            yield f, None, e
+        else:
+            yield f, doc, None
+
+
+def _read_parallel(files, jobs: int):
+    """Yield ``(file, doc, error)`` in input order, parsing in ``jobs`` processes.
+
+    At most ``2 * jobs`` parsed sources are in flight at once.
+    """
+    files = list(files)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = []
+        next_index = 0
+        while pending or next_index < len(files):
+            while next_index < len(files) and len(pending) < 2 * jobs:
+                f = files[next_index]
+                pending.append((f, pool.submit(_parse_source, str(f))))
+                next_index += 1
+            f, future = pending.pop(0)
+            data, error = future.result()
+            if data is None:
+                yield f, None, error
+                continue
+            with instrument.span("unpickle", file=Path(f).name):
+                doc = pickle.loads(data)
+            yield f, doc, None
+
+
+def _splice_entities(frame_file: str, spool_file: str, output: str,
+                     encoding: str) -> None:
+    """Copy ``frame_file`` to ``output`` inserting ``spool_file`` as ENTITIES."""
+    with open(frame_file, "r", encoding=encoding) as src, \
+            open(output, "w", encoding=encoding) as dst:
+        prev_value = None
+        while True:
+            code = src.readline()
+            value = src.readline()
+            if not code:
+                break
+            dst.write(code)
+            dst.write(value)
+            if (
+                code.strip() == "2"
+                and value.strip() == "ENTITIES"
+                and prev_value == "SECTION"
+            ):
+                with open(spool_file, "r", encoding=encoding) as spool:
+                    shutil.copyfileobj(spool, dst, 1 << 20)
+            prev_value = value.strip()
+
+
+# "0 SECTION / 2 ENTITIES" as written by the binary tag writer for R2000+
+_BINARY_ENTITIES = b"\x00\x00SECTION\x00\x02\x00ENTITIES\x00"
+
+
+def _splice_entities_binary(frame_file: str, spool_file: str, output: str) -> None:
+    """Binary DXF version of :func:`_splice_entities`."""
+    with open(frame_file, "rb") as src:
+        frame = src.read()
+    pos = frame.find(_BINARY_ENTITIES)
+    if pos < 0:
+        raise ValueError(f"No ENTITIES section in {frame_file}")
+    pos += len(_BINARY_ENTITIES)
+    with open(output, "wb") as dst:
+        dst.write(frame[:pos])
+        with open(spool_file, "rb") as spool:
+            shutil.copyfileobj(spool, dst, 1 << 20)
+        dst.write(frame[pos:])
+
+
+def merge_files(files, output: str, strategy="importer", jobs: int = 1,
+                stream: bool = False, report=None, index: str = None,
+                binary: bool = False, entity_filter: EntityFilter = None,
+                prune: bool = False, simplifier: GeometrySimplifier = None) -> dict:
+    """Merge the modelspace of every DXF in ``files`` into ``output``.
+
+    ``strategy`` is a name from :data:`STRATEGIES` or a strategy instance.
+    ``jobs > 1`` parses the sources in worker processes while the main
+    process assembles them in input order, so the result does not depend on
+    ``jobs``.  With ``stream`` each source's entities are spooled to disk
+    right after they were merged and spliced into the saved document at the
+    end, so the merged modelspace is never held in memory.  ``report`` is
+    called as ``report(name, entity_count, error)`` for every source.
+    ``index`` names a file to write a :class:`spatial_index.SpatialIndex` of
+    the merged entities' bounding boxes tagged with their source file.
+    ``binary`` writes ``output`` as binary DXF, which is smaller and faster
+    to save and load than ASCII DXF.  Only the source entities selected by
+    ``entity_filter`` are merged, the others are never copied; ``prune``
+    deletes blocks, layers and text styles no merged entity refers to.
+    ``simplifier`` quantizes and simplifies the merged entities of every
+    source; the polyline vertex counts before and after are returned per
+    source under ``"vertices"``.
+
+    Returns ``{"files": merged_files, "entities": merged_entities,
+    "filtered": skipped_entities}``, plus the number of pruned definitions
+    under ``"pruned"`` with ``prune``; nothing is written when no file
+    could be merged.
+    """
+    if isinstance(strategy, str):
+        strategy = STRATEGIES[strategy]()
+    report = report or _print_report
+    merged = ezdxf.new()
+    msp = merged.modelspace()
+    cache = ResourceCache(merged)
+    stats = {"files": 0, "entities": 0, "filtered": 0}
+    usage = UsageTracker() if prune else None
+    if simplifier is not None:
+        stats["vertices"] = {}
+    spatial = SpatialIndex() if index else None
+    bbox_cache = bbox.Cache() if index else None
+    sources = _read_parallel(files, jobs) if jobs > 1 else _read_serial(files)
+    fmt = "bin" if binary else "asc"
+
+    with tempfile.TemporaryDirectory(prefix="merge_") as tmp_dir:
+        spool_file = os.path.join(tmp_dir, "entities.dxf")
+        spool = tagwriter = None
+        if stream and binary:
+            spool = open(spool_file, "wb")
+            tagwriter = BinaryTagWriter(
+                spool, merged.dxfversion, encoding=merged.output_encoding
+            )
+        elif stream:
+            spool = open(spool_file, "w", encoding=merged.output_encoding)
+            tagwriter = TagWriter(spool, merged.dxfversion)
+        try:
+            for f, doc, error in sources:
+                name = Path(f).name
+                if error is not None:
+                    report(name, 0, error)
+                    continue
+                selected = None
+                if entity_filter is not None:
+                    with instrument.span("filter", file=name):
+                        selected = entity_filter.select(doc)
+                    stats["filtered"] += len(doc.modelspace()) - len(selected)
+                with instrument.span("merge", file=name) as span:
+                    new_entities = strategy.merge(doc, msp, cache, name, selected)
+                    count = len(new_entities)
+                    span.set(entities=count)
+                if simplifier is not None:
+                    with instrument.span("simplify", file=name) as span:
+                        before, after = simplifier.process(new_entities)
+                        span.set(vertices=before, kept=after)
+                    stats["vertices"][name] = (before, after)
+                if usage is not None:
+                    usage.add(new_entities)
+                if spatial is not None:
+                    with instrument.span("index", file=name):
+                        index_entities(spatial, new_entities, name, bbox_cache)
+                del doc, new_entities, selected
+                if stream:
+                    with instrument.span("spool", file=name):
+                        for entity in msp:
+                            entity.export_dxf(tagwriter)
+                            # the extension dictionary stays in the frame's
+                            # OBJECTS section; destroying the entity must not
+                            # take it along
+                            entity.extension_dict = None
+                        msp.delete_all_entities()
+                stats["files"] += 1
+                stats["entities"] += count
+                report(name, count, None)
+        finally:
+            if spool is not None:
+                spool.close()
+
+        if stats["files"] == 0:
+            return stats
+        if usage is not None:
+            with instrument.span("prune"):
+                stats["pruned"] = usage.prune(merged)
+        with instrument.span("save", file=Path(output).name, entities=stats["entities"]):
+            if stream:
+                frame_file = os.path.join(tmp_dir, "frame.dxf")
+                merged.saveas(frame_file, fmt=fmt)
+                if binary:
+                    _splice_entities_binary(frame_file, spool_file, output)
+                else:
+                    _splice_entities(
+                        frame_file, spool_file, output, merged.output_encoding
+                    )
+            else:
+                merged.saveas(output, fmt=fmt)
+    if spatial is not None:
+        with instrument.span("save_index", file=Path(index).name):
+            spatial.save(index)
+    return stats
@@ -0,0 +1,203 @@
+"""Merge-time entity filters and pruning of unused definitions.
+
+An :class:`EntityFilter` decides which modelspace entities of a source
+document are merged at all; rejected entities are never copied or
+imported.  Entities can be selected by layer globs, by DXF type, by
+overlap with a bounding box and by the visibility of their layer::
+
+    EntityFilter(exclude_layers=["*FZX*", "DEFPOINTS"], types=["LINE", "LWPOLYLINE"],
+                 bbox=(1000, 2000, 1500, 2600), visible_only=True)
+
+:class:`UsageTracker` records the layers, text styles and blocks the
+merged entities refer to, so :meth:`UsageTracker.prune` can delete the
+definitions nothing refers to before the merged document is saved.  The
+tracker sees the entities right after they were merged, which also works
+for streaming merges where the modelspace is emptied after every source.
+"""
+
+from fnmatch import fnmatchcase
+
+from ezdxf import bbox
+from ezdxf.render.arrows import ARROWS
+
+# layers which must exist in every DXF document
+_REQUIRED_LAYERS = {"0", "defpoints"}
+_REQUIRED_STYLES = {"standard"}
+# dimension style attributes naming arrow blocks
+_DIMSTYLE_BLOCKS = ("dimblk", "dimblk1", "dimblk2", "dimldrblk")
+
+
+def _lower_globs(patterns):
+    return [p.lower() for p in patterns] if patterns else None
+
+
+class EntityFilter:
+    """Select the modelspace entities of a source document to merge.
+
+    ``layers`` and ``exclude_layers`` are case-insensitive globs matched
+    against the entity layer, ``types`` and ``exclude_types`` DXF type names
+    such as ``"LWPOLYLINE"``.  With ``bbox`` given as ``(minx, miny, maxx,
+    maxy)`` only entities whose bounding box overlaps it are kept; entities
+    are kept whole, not clipped at the border.  ``visible_only`` drops
+    entities on frozen or switched off layers.
+    """
+
+    def __init__(self, layers=None, exclude_layers=None, types=None,
+                 exclude_types=None, bbox=None, visible_only: bool = False):
+        self.layers = _lower_globs(layers)
+        self.exclude_layers = _lower_globs(exclude_layers)
+        self.types = {t.upper() for t in types} if types else None
+        self.exclude_types = {t.upper() for t in exclude_types or ()}
+        self.bbox = bbox
+        self.visible_only = visible_only
+
+    def _layer_ok(self, layer: str, hidden: set) -> bool:
+        layer = layer.lower()
+        if layer in hidden:
+            return False
+        if self.layers is not None and not any(fnmatchcase(layer, p) for p in self.layers):
+            return False
+        if self.exclude_layers and any(fnmatchcase(layer, p) for p in self.exclude_layers):
+            return False
+        return True
+
+    def _overlaps(self, entity, cache) -> bool:
+        extents = bbox.extents([entity], fast=True, cache=cache)
+        if not extents.has_data:
+            return False
+        minx, miny, maxx, maxy = self.bbox
+        return (
+            extents.extmin.x <= maxx and extents.extmax.x >= minx
+            and extents.extmin.y <= maxy and extents.extmax.y >= miny
+        )
+
+    def select(self, source) -> list:
+        """Return the modelspace entities of ``source`` passing the filter."""
+        hidden = set()
+        if self.visible_only:
+            hidden = {
+                layer.dxf.name.lower() for layer in source.layers
+                if layer.is_frozen() or layer.is_off()
+            }
+        cache = bbox.Cache() if self.bbox else None
+        layer_ok = {}
+        selected = []
+        for entity in source.modelspace():
+            dxftype = entity.dxftype()
+            if self.types is not None and dxftype not in self.types:
+                continue
+            if dxftype in self.exclude_types:
+                continue
+            layer = entity.dxf.get("layer", "0")
+            ok = layer_ok.get(layer)
+            if ok is None:
+                ok = layer_ok[layer] = self._layer_ok(layer, hidden)
+            if not ok:
+                continue
+            if self.bbox is not None and not self._overlaps(entity, cache):
+                continue
+            selected.append(entity)
+        return selected
+
+
+class UsageTracker:
+    """Collect the layers, text styles and blocks referenced by entities."""
+
+    def __init__(self):
+        self.layers = set()
+        self.styles = set()
+        self.blocks = set()
+
+    def add(self, entities) -> None:
+        """Record the definitions ``entities`` refer to."""
+        for entity in entities:
+            self._add_entity(entity)
+            if entity.dxftype() == "INSERT":
+                self.blocks.add(entity.dxf.name.lower())
+                for attrib in entity.attribs:
+                    self._add_entity(attrib)
+            elif entity.dxftype() == "DIMENSION" and entity.dxf.hasattr("geometry"):
+                self.blocks.add(entity.dxf.geometry.lower())
+
+    def _add_entity(self, entity) -> None:
+        self.layers.add(entity.dxf.get("layer", "0").lower())
+        if entity.dxf.is_supported("style"):
+            self.styles.add(entity.dxf.get("style", "Standard").lower())
+
+    def prune_blocks(self, doc) -> int:
+        """Delete the blocks of ``doc`` nothing refers to, return their number.
+
+        Blocks are used when tracked entities, entities in layouts or
+        anonymous blocks, dimension styles or other used blocks refer to
+        them; layout blocks and anonymous blocks are never deleted.
+        """
+        blocks = {b.name.lower(): b for b in doc.blocks}
+        for block in blocks.values():
+            if block.name.startswith("*") or block.is_any_layout:
+                self.add(block)
+        for dimstyle in doc.dimstyles:
+            for attrib in _DIMSTYLE_BLOCKS:
+                if dimstyle.dxf.hasattr(attrib):
+                    self.blocks.add(ARROWS.block_name(dimstyle.dxf.get(attrib)).lower())
+                record = doc.entitydb.get(dimstyle.dxf.get(attrib + "_handle"))
+                if record is not None:
+                    self.blocks.add(record.dxf.name.lower())
+
+        used_blocks = set()
+        pending = [name for name in self.blocks if name in blocks]
+        while pending:
+            name = pending.pop()
+            if name in used_blocks:
+                continue
+            used_blocks.add(name)
+            before = set(self.blocks)
+            self.add(blocks[name])
+            pending.extend(n for n in self.blocks - before if n in blocks)
+
+        removed = 0
+        for name, block in blocks.items():
+            if name in used_blocks or block.name.startswith("*") or block.is_any_layout:
+                continue
+            doc.blocks.delete_block(block.name, safe=False)
+            removed += 1
+        return removed
+
+    def prune(self, doc) -> dict:
+        """Delete definitions of ``doc`` not referenced by tracked entities.
+
+        Blocks are pruned by :meth:`prune_blocks` first, so layers and text
+        styles used only in deleted blocks are deleted as well.  Returns the
+        number of deleted ``{"blocks", "layers", "styles"}``.
+        """
+        removed = {"blocks": self.prune_blocks(doc), "layers": 0, "styles": 0}
+        for block in doc.blocks:
+            self.layers.add(block.block.dxf.get("layer", "0").lower())
+
+        keep_layers = self.layers | _REQUIRED_LAYERS
+        keep_layers.add(str(doc.header.get("$CLAYER", "0")).lower())
+        for layer in list(doc.layers):
+            if layer.dxf.name.lower() not in keep_layers:
+                doc.layers.remove(layer.dxf.name)
+                removed["layers"] += 1
+
+        keep_handles = set()
+        for dimstyle in doc.dimstyles:
+            keep_handles.add(dimstyle.dxf.get("dimtxsty_handle"))
+        for linetype in doc.linetypes:
+            pattern = linetype.pattern_tags
+            if pattern.is_complex_type():
+                keep_handles.add(pattern.get_style_handle())
+        keep_styles = self.styles | _REQUIRED_STYLES
+        keep_styles.add(str(doc.header.get("$TEXTSTYLE", "Standard")).lower())
+        for style in list(doc.styles):
+            name = style.dxf.name
+            if (
+                not name  # shape files
+                or name.lower() in keep_styles
+                or style.dxf.handle in keep_handles
+                or style.dxf.flags & 1
+            ):
+                continue
+            doc.styles.remove(name)
+            removed["styles"] += 1
+        return removed
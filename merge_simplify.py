@@ -0,0 +1,170 @@
+"""Coordinate quantization and polyline simplification for merged entities.
+
+Survey sheets carry full double precision and densely sampled polylines.
+A :class:`GeometrySimplifier` is applied to the entities of every source
+right after they were merged:
+
+- ``quantum`` snaps the coordinates of points, lines, circles, arcs, texts,
+  inserts and polyline vertices to multiples of ``quantum`` drawing units.
+- ``tolerance`` removes LWPOLYLINE and 2D/3D POLYLINE vertices with the
+  Douglas-Peucker algorithm, so no removed vertex lies farther than
+  ``tolerance`` from the simplified polyline.  Vertices at the ends of arc
+  segments (bulges) or with a line width are always kept.
+
+The vertex math runs on NumPy arrays, one polyline at a time.  Block
+definitions are left as they are.
+"""
+
+import numpy as np
+
+# point attributes snapped by quantization; direction vectors such as the
+# extrusion must not be rounded
+_POINT_ATTRIBS = (
+    "start", "end", "center", "insert", "location", "align_point",
+    "defpoint", "defpoint2", "defpoint3", "defpoint4", "defpoint5",
+    "text_midpoint",
+)
+# POLYLINE vertex flags of curve/spline fitted polylines
+_FIT_VERTEX_FLAGS = 1 | 8 | 16
+
+
+def quantize(values: np.ndarray, quantum: float) -> np.ndarray:
+    """Round ``values`` to the nearest multiple of ``quantum``."""
+    return np.round(values / quantum) * quantum
+
+
+def _segment_distances(points: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """Distances of ``points`` to the segment ``start`` - ``end``."""
+    direction = end - start
+    length2 = float(direction @ direction)
+    offsets = points - start
+    if length2 == 0.0:
+        return np.sqrt((offsets * offsets).sum(axis=1))
+    t = np.clip(offsets @ direction / length2, 0.0, 1.0)
+    nearest = start + t[:, None] * direction
+    delta = points - nearest
+    return np.sqrt((delta * delta).sum(axis=1))
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float, keep: np.ndarray = None) -> np.ndarray:
+    """Return a boolean mask of the vertices to keep.
+
+    ``points`` is an ``(n, 2)`` or ``(n, 3)`` array of an open polyline;
+    the first and last vertex and all vertices set in ``keep`` are always
+    kept.
+    """
+    n = len(points)
+    mask = np.zeros(n, dtype=bool) if keep is None else keep.copy()
+    mask[0] = mask[-1] = True
+    anchors = np.flatnonzero(mask)
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _segment_distances(points[first + 1:last], points[first], points[last])
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            mask[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return mask
+
+
+def _simplify_mask(points: np.ndarray, tolerance: float, closed: bool,
+                   keep: np.ndarray) -> np.ndarray:
+    if not closed:
+        return douglas_peucker(points, tolerance, keep)
+    # anchor a closed polyline at its first vertex and the vertex farthest
+    # from it, then simplify the ring including the closing segment
+    offsets = points - points[0]
+    farthest = int(np.argmax((offsets * offsets).sum(axis=1)))
+    ring = np.vstack([points, points[:1]])
+    ring_keep = np.append(keep, True)
+    ring_keep[farthest] = True
+    return douglas_peucker(ring, tolerance, ring_keep)[:-1]
+
+
+class GeometrySimplifier:
+    """Quantize and simplify merged entities in place.
+
+    Either ``quantum`` or ``tolerance`` may be ``None`` to skip that step.
+    """
+
+    def __init__(self, quantum: float = None, tolerance: float = None):
+        self.quantum = quantum or None
+        self.tolerance = tolerance or None
+
+    def process(self, entities) -> tuple:
+        """Process ``entities``, return ``(vertices_before, vertices_after)``."""
+        before = after = 0
+        for entity in entities:
+            dxftype = entity.dxftype()
+            if dxftype == "LWPOLYLINE":
+                counts = self._lwpolyline(entity)
+            elif dxftype == "POLYLINE":
+                counts = self._polyline(entity)
+            else:
+                if self.quantum:
+                    self._quantize_points(entity)
+                continue
+            before += counts[0]
+            after += counts[1]
+        return before, after
+
+    def _quantize_points(self, entity) -> None:
+        for name in _POINT_ATTRIBS:
+            if entity.dxf.hasattr(name):
+                point = np.array(entity.dxf.get(name), dtype=float)
+                entity.dxf.set(name, tuple(quantize(point, self.quantum)))
+
+    def _lwpolyline(self, entity) -> tuple:
+        data = np.array(entity.get_points("xyseb"), dtype=float)
+        count = len(data)
+        if count == 0:
+            return 0, 0
+        if self.quantum:
+            data[:, :2] = quantize(data[:, :2], self.quantum)
+        if self.tolerance and count > 2:
+            keep = (data[:, 2] != 0) | (data[:, 3] != 0)
+            arcs = data[:, 4] != 0
+            keep |= arcs | np.roll(arcs, 1)  # both ends of a bulged segment
+            mask = _simplify_mask(data[:, :2], self.tolerance, entity.closed, keep)
+            data = data[mask]
+        entity.set_points(data.tolist(), format="xyseb")
+        return count, len(data)
+
+    def _polyline(self, entity) -> tuple:
+        vertices = entity.vertices
+        count = len(vertices)
+        if not (entity.is_2d_polyline or entity.is_3d_polyline) or count == 0:
+            return count, count
+        if any(v.dxf.flags & _FIT_VERTEX_FLAGS for v in vertices):
+            return count, count
+        points = np.array([v.dxf.location for v in vertices], dtype=float)
+        if self.quantum:
+            points = quantize(points, self.quantum)
+            for vertex, point in zip(vertices, points):
+                vertex.dxf.location = tuple(point)
+        if not self.tolerance or count <= 2:
+            return count, count
+        keep = np.array([
+            v.dxf.get("start_width", 0) != 0 or v.dxf.get("end_width", 0) != 0
+            for v in vertices
+        ])
+        arcs = np.array([v.dxf.get("bulge", 0) != 0 for v in vertices])
+        keep |= arcs | np.roll(arcs, 1)
+        dims = 3 if entity.is_3d_polyline else 2
+        mask = _simplify_mask(points[:, :dims], self.tolerance, entity.is_closed, keep)
+        if mask.all():
+            return count, count
+        removed = [v for v, k in zip(vertices, mask) if not k]
+        vertices[:] = [v for v, k in zip(vertices, mask) if k]
+        db = entity.doc.entitydb if entity.doc else None
+        for vertex in removed:
+            if db is not None:
+                db.delete_entity(vertex)
+            else:
+                vertex.destroy()
+        return count, len(vertices)
@@ -0,0 +1,208 @@
+"""Collect, convert, block-wrap and merge DWG drawings in one streaming run.
+
+Every DWG found under the source folder flows through the stages as soon
+as the previous stage is done with it::
+
+    collect -> convert (N workers) -> read / block-wrap -> merge
+
+The stages are connected by bounded queues, so merging starts while later
+files are still being converted and at most a handful of converted DXF
+files and parsed documents exist at any time.  Converted DXFs are written
+to a temporary folder and removed once merged unless ``--keep-dxf`` names
+a folder to keep them in.
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import ezdxf
+
+import dxf_cache
+import instrument
+from batch_block_by_filename import all_entities_to_block
+from convert_dwg_to_dxf import _convert_file, _no_gui_display
+from merge_engine import ImporterStrategy, ResourceCache
+
+_DONE = object()
+
+
+def _collect(src: str, out: queue.Queue, workers: int) -> None:
+    """Put every DWG under ``src`` into ``out``, skipping duplicate names."""
+    seen = set()
+    try:
+        for root, dirs, files in os.walk(src):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.lower().endswith('.dwg') or name in seen:
+                    continue
+                seen.add(name)
+                out.put(Path(root) / name)
+    finally:
+        for _ in range(workers):
+            out.put(_DONE)
+
+
+def _convert(inp: queue.Queue, out: queue.Queue, work_dir: str, version: str,
+             display: Optional[str], timeout: Optional[float]) -> None:
+    """Convert DWGs from ``inp`` and pass the DXF paths on to ``out``."""
+    try:
+        while True:
+            src_path = inp.get()
+            if src_path is _DONE:
+                return
+            dest_path = Path(work_dir) / (src_path.stem + '.dxf')
+            try:
+                _convert_file(src_path, dest_path, version, display, timeout)
+            except Exception as e:
+                print(f"Failed to convert {src_path}: {e}")
+                continue
+            print(f"Converted {src_path} -> {dest_path}")
+            out.put(dest_path)
+    finally:
+        out.put(_DONE)
+
+
+def _load(inp: queue.Queue, out: queue.Queue, workers: int,
+          wrap_blocks: bool, keep_dxf: bool) -> None:
+    """Read converted DXFs, optionally wrap them into a block, pass them on."""
+    try:
+        remaining = workers
+        while remaining:
+            dxf_path = inp.get()
+            if dxf_path is _DONE:
+                remaining -= 1
+                continue
+            try:
+                # only kept DXFs are worth caching, temporary ones are deleted
+                read = dxf_cache.readfile if keep_dxf else ezdxf.readfile
+                with instrument.span("read", file=dxf_path.name):
+                    doc = read(dxf_path)
+                if wrap_blocks:
+                    with instrument.span("wrap", file=dxf_path.name):
+                        all_entities_to_block(doc, dxf_path.stem)
+            except Exception as e:
+                print(f"Failed to read {dxf_path}: {e}")
+                continue
+            finally:
+                if not keep_dxf:
+                    dxf_path.unlink(missing_ok=True)
+            out.put((dxf_path.name, doc))
+    finally:
+        out.put(_DONE)
+
+
+def run_pipeline(src: str, output: str, version: str = "R2013", jobs: int = 2,
+                 wrap_blocks: bool = False, keep_dxf: Optional[str] = None,
+                 queue_size: int = 4, timeout: Optional[float] = None,
+                 binary: bool = False) -> int:
+    """Stream all DWGs under ``src`` into the merged DXF ``output``.
+
+    ``jobs`` converter workers run in parallel and each queue holds at most
+    ``queue_size`` items.  With ``wrap_blocks`` every drawing is wrapped
+    into a block named after its file like ``batch_block_by_filename``.
+    ``binary`` writes ``output`` as binary DXF.
+    Returns the number of merged drawings.
+    """
+    jobs = max(1, jobs)
+    dwg_queue = queue.Queue(maxsize=queue_size)
+    dxf_queue = queue.Queue(maxsize=queue_size)
+    doc_queue = queue.Queue(maxsize=queue_size)
+    if keep_dxf:
+        os.makedirs(keep_dxf, exist_ok=True)
+    work_dir = keep_dxf or tempfile.mkdtemp(prefix="pipeline_")
+
+    merged = ezdxf.new()
+    msp = merged.modelspace()
+    cache = ResourceCache(merged)
+    strategy = ImporterStrategy()
+    merged_count = 0
+    try:
+        with _no_gui_display() as display:
+            threads = [
+                threading.Thread(target=_collect, args=(src, dwg_queue, jobs))
+            ]
+            threads += [
+                threading.Thread(
+                    target=_convert,
+                    args=(dwg_queue, dxf_queue, work_dir, version, display, timeout),
+                )
+                for _ in range(jobs)
+            ]
+            threads.append(threading.Thread(
+                target=_load,
+                args=(dxf_queue, doc_queue, jobs, wrap_blocks, bool(keep_dxf)),
+            ))
+            for t in threads:
+                t.daemon = True
+                t.start()
+
+            while True:
+                item = doc_queue.get()
+                if item is _DONE:
+                    break
+                name, doc = item
+                with instrument.span("merge", file=name) as span:
+                    span.set(entities=len(strategy.merge(doc, msp, cache, name)))
+                print(f"Merged {name}")
+                merged_count += 1
+            for t in threads:
+                t.join()
+    finally:
+        if not keep_dxf:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if merged_count > 0:
+        with instrument.span("save", file=Path(output).name):
+            merged.saveas(output, fmt="bin" if binary else "asc")
+        print(f"Successfully merged {merged_count} files into {output}")
+    else:
+        print("No files were successfully merged")
+    return merged_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Collect, convert and merge DWG files in one run"
+    )
+    parser.add_argument("src", help="Directory tree containing DWG files")
+    parser.add_argument("output", help="Path of merged DXF file")
+    parser.add_argument(
+        "--version", default="R2013", help="DXF version for conversion (default: R2013)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=2,
+        help="Number of converter processes to run at once (default: 2)",
+    )
+    parser.add_argument(
+        "--blocks", action="store_true",
+        help="Wrap each drawing into a block named after its file before merging",
+    )
+    parser.add_argument(
+        "--keep-dxf", metavar="DIR",
+        help="Keep the converted DXF files in DIR instead of deleting them",
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=4,
+        help="Maximum number of items waiting between two stages (default: 4)",
+    )
+    parser.add_argument(
+        "--timeout", type=float,
+        help="Seconds a single conversion may take before it is abandoned",
+    )
+    parser.add_argument(
+        "--binary", action="store_true",
+        help="Write the merged file as binary DXF",
+    )
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+    instrument.from_args(args)
+    run_pipeline(
+        args.src, args.output, args.version, args.jobs, args.blocks,
+        args.keep_dxf, args.queue_size, args.timeout, args.binary,
+    )
@@ -0,0 +1,208 @@
+"""Grid index of entity bounding boxes in a merged DXF.
+
+The merge writes one entry per modelspace entity: its handle, the source
+file it came from and its 2D bounding box.  Queries such as "which task
+sheets overlap this chainage window" are then answered from the index
+instead of rescanning the merged drawing::
+
+    python spatial_index.py query merged.idx.json 1000 2000 1500 2600
+    python spatial_index.py build merged.dxf merged.idx.json
+
+``build`` indexes an existing merged DXF; the source of an entity is taken
+from its ``MERGE_SOURCE`` XDATA (see ``merge_dxf_files``) or, failing that,
+from its layer, which is the file name for the ``layer`` merge strategy.
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from collections import defaultdict
+
+from file_utils import write_json_atomic
+
+INDEX_VERSION = 1
+# entities covering more cells than this are kept in a list scanned linearly
+MAX_CELLS_PER_ENTRY = 1024
+
+
+class SpatialIndex:
+    """Uniform grid over ``(handle, source, bbox)`` entries.
+
+    Entries are collected with :meth:`add`; the grid is built on the first
+    query, with a cell size derived from the overall extents and the number
+    of entries unless ``cell_size`` is given.
+    """
+
+    def __init__(self, cell_size: float = None):
+        self.cell_size = cell_size
+        self.sources = []
+        self._source_ids = {}
+        self.entries = []
+        self._grid = None
+        self._large = None
+
+    def add(self, handle: str, source: str, bbox) -> None:
+        """Add an entity with ``bbox`` given as ``(minx, miny, maxx, maxy)``."""
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = self._source_ids[source] = len(self.sources)
+            self.sources.append(source)
+        minx, miny, maxx, maxy = bbox
+        self.entries.append((handle, source_id, minx, miny, maxx, maxy))
+        self._grid = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _auto_cell_size(self) -> float:
+        minx = min(e[2] for e in self.entries)
+        miny = min(e[3] for e in self.entries)
+        maxx = max(e[4] for e in self.entries)
+        maxy = max(e[5] for e in self.entries)
+        extent = max(maxx - minx, maxy - miny)
+        return extent / math.sqrt(len(self.entries)) if extent > 0 else 1.0
+
+    def _cells(self, minx, miny, maxx, maxy):
+        size = self.cell_size
+        return (
+            range(math.floor(minx / size), math.floor(maxx / size) + 1),
+            range(math.floor(miny / size), math.floor(maxy / size) + 1),
+        )
+
+    def _build(self) -> None:
+        if not self.cell_size:
+            self.cell_size = self._auto_cell_size() if self.entries else 1.0
+        grid = defaultdict(list)
+        large = []
+        for i, entry in enumerate(self.entries):
+            xs, ys = self._cells(*entry[2:])
+            if len(xs) * len(ys) > MAX_CELLS_PER_ENTRY:
+                large.append(i)
+                continue
+            for ix in xs:
+                for iy in ys:
+                    grid[(ix, iy)].append(i)
+        self._grid = dict(grid)
+        self._large = large
+
+    def query(self, bbox) -> list:
+        """Return ``(source, handle)`` of all entries overlapping ``bbox``."""
+        if self._grid is None:
+            self._build()
+        minx, miny, maxx, maxy = bbox
+        xs, ys = self._cells(minx, miny, maxx, maxy)
+        if len(xs) * len(ys) > len(self._grid):
+            candidates = set(range(len(self.entries)))
+        else:
+            candidates = set(self._large)
+            for ix in xs:
+                for iy in ys:
+                    candidates.update(self._grid.get((ix, iy), ()))
+        result = []
+        for i in sorted(candidates):
+            handle, source_id, x0, y0, x1, y1 = self.entries[i]
+            if x0 <= maxx and x1 >= minx and y0 <= maxy and y1 >= miny:
+                result.append((self.sources[source_id], handle))
+        return result
+
+    def query_sources(self, bbox) -> list:
+        """Return the sorted source names with entities overlapping ``bbox``."""
+        return sorted({source for source, _ in self.query(bbox)})
+
+    def save(self, path: str) -> None:
+        if self._grid is None:
+            self._build()
+        data = {
+            "version": INDEX_VERSION,
+            "cell_size": self.cell_size,
+            "sources": self.sources,
+            "entries": self.entries,
+        }
+        write_json_atomic(path, data, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "SpatialIndex":
+        with open(path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in {path}")
+        index = cls(data["cell_size"])
+        index.sources = data["sources"]
+        index._source_ids = {name: i for i, name in enumerate(index.sources)}
+        index.entries = [tuple(e) for e in data["entries"]]
+        index._build()
+        return index
+
+
+def entity_bbox(entity, cache=None):
+    """Return the 2D bounding box of a DXF ``entity`` or ``None``."""
+    from ezdxf import bbox
+
+    extents = bbox.extents([entity], fast=True, cache=cache)
+    if not extents.has_data:
+        return None
+    return (extents.extmin.x, extents.extmin.y, extents.extmax.x, extents.extmax.y)
+
+
+def index_entities(index: SpatialIndex, entities, source: str, cache=None) -> None:
+    """Add ``entities`` of ``source`` that have a bounding box to ``index``."""
+    for entity in entities:
+        box = entity_bbox(entity, cache)
+        if box is not None:
+            index.add(entity.dxf.handle, source, box)
+
+
+def build_from_dxf(dxf_file: str) -> SpatialIndex:
+    """Index the modelspace of an existing merged DXF."""
+    from ezdxf import bbox
+
+    from dxf_cache import readfile
+
+    doc = readfile(dxf_file)
+    index = SpatialIndex()
+    cache = bbox.Cache()
+    for entity in doc.modelspace():
+        source = entity.dxf.layer
+        if entity.has_xdata("MERGE_SOURCE"):
+            source = entity.get_xdata("MERGE_SOURCE")[0].value
+        box = entity_bbox(entity, cache)
+        if box is not None:
+            index.add(entity.dxf.handle, source, box)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or build a DXF spatial index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    query_parser = sub.add_parser("query", help="List sources and handles in a box")
+    query_parser.add_argument("index", help="Index file written by the merge")
+    for name in ("minx", "miny", "maxx", "maxy"):
+        query_parser.add_argument(name, type=float)
+    query_parser.add_argument(
+        "--handles", action="store_true", help="Also list the entity handles"
+    )
+    build_parser = sub.add_parser("build", help="Index an existing merged DXF")
+    build_parser.add_argument("dxf", help="Merged DXF file")
+    build_parser.add_argument("index", help="Index file to write")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        spatial_index = build_from_dxf(args.dxf)
+        spatial_index.save(args.index)
+        print(f"Indexed {len(spatial_index)} entities into {args.index}")
+    else:
+        spatial_index = SpatialIndex.load(args.index)
+        box = (args.minx, args.miny, args.maxx, args.maxy)
+        start = time.perf_counter()
+        hits = spatial_index.query(box)
+        elapsed = (time.perf_counter() - start) * 1000
+        by_source = defaultdict(list)
+        for source, handle in hits:
+            by_source[source].append(handle)
+        for source in sorted(by_source):
+            print(f"{source}: {len(by_source[source])} entities")
+            if args.handles:
+                print("  " + " ".join(by_source[source]))
+        print(f"{len(hits)} entities from {len(by_source)} sources ({elapsed:.3f} ms)")
@@ -19,19 +19,27 @@ unreturned.
 from __future__ import annotations
 
 import argparse
+import csv
+import hashlib
+import json
 import re
+import shutil
 import sys
+import time
 from collections import defaultdict
 from typing import Iterable, List
 import os
 
 try:
+    import numpy as np
     import pandas as pd
     import matplotlib.pyplot as plt
 except Exception:
     sys.stderr.write("pandas and matplotlib are required to run this script\n")
     raise
 
+from file_utils import file_hash, write_json_atomic
+
 
 DEFAULT_ZS_FILE = "沪乍杭-线路任务单一览表-补定测.xlsx"
 DEFAULT_RETURNED_FILE = "对应表格.xlsx"
@@ -64,53 +72,441 @@ def _parse_task_code(value: object):
 TASK_TEXT_RE = re.compile(r"(\d+)[-－](\d+)")
 
 
-def _load_required_tasks(filename: str = DEFAULT_ZS_FILE):
-    """Load required tasks from the ZS workbook.
+ROAD_LEVEL = "\u9053\u8def\u6284\u5e73"  # 道路抄平
+TERRAIN = "\u6838\u8865\u5730\u5f62"  # 核补地形
+ROAD_LEVEL_RE = "\u6284\u5e73|\u8d85\u5e73"  # 抄平 / 超平
+TERRAIN_RE = "\u6838\u8865"  # 核补
 
-    Returns a mapping ``{(form_no, index): category}`` where ``category`` is
-    either ``"\u9053\u8def\u6284\u5e73"`` (road levelling), ``"\u6838\u8865\u5730\u5f62"``
-    (terrain check) or ``None`` when no keywords match.
+
+def _row_hits(strings: "pd.Series", same_row_next: np.ndarray, pattern: str) -> np.ndarray:
+    """Per cell: does ``pattern`` match the row text at this cell.
+
+    The row text is the concatenation of the row's strings, so a two
+    character keyword may also span the end of one cell and the start of
+    the next.
+    """
+    hits = strings.str.contains(pattern, na=False).to_numpy(dtype=bool)
+    pairs = strings.str[-1:] + strings.shift(-1).str[:1]
+    spanning = pairs.str.contains(pattern, na=False).to_numpy(dtype=bool)
+    return hits | (same_row_next & spanning)
+
+
+def _scan_sheets_frames(frames: list) -> list:
+    """Return ``[(frame, row, (form_no, index), category), ...]`` for ``frames``.
+
+    ``frame`` is the position of the frame in ``frames`` and ``row`` the
+    zero-based row in it.  The first string cell of a row matching
+    :data:`TASK_TEXT_RE` gives the task, the keywords anywhere in the row's
+    strings give the category.
+    The cells of all sheets are stacked into one Series so the matching
+    runs as a few vectorized string operations instead of a Python loop
+    per cell.
+    """
+    rows, values, starts = [], [], []
+    offset = 0
+    for df in frames:
+        data = df.to_numpy(dtype=object)
+        r, c = np.nonzero(pd.notna(data))  # row-major: row, then column order
+        rows.append(r + offset)
+        values.append(data[r, c])
+        starts.append(offset)
+        offset += len(df)
+    if not offset:
+        return []
+    cells = pd.Series(np.concatenate(values), dtype=object)
+    # not cells.str: the accessor refuses Series without any string
+    is_string = cells.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    strings = cells[is_string].reset_index(drop=True)
+    row = np.concatenate(rows)[is_string]
+    if not len(row):
+        return []
+
+    # category of every row, road levelling wins over terrain
+    row_ids, cell_row = np.unique(row, return_inverse=True)
+    same_row_next = np.append(row[1:] == row[:-1], False)
+    terrain = np.bincount(cell_row, _row_hits(strings, same_row_next, TERRAIN_RE)) > 0
+    road = np.bincount(cell_row, _row_hits(strings, same_row_next, ROAD_LEVEL_RE)) > 0
+    category = np.full(len(row_ids), None, dtype=object)
+    category[terrain] = TERRAIN
+    category[road] = ROAD_LEVEL
+
+    codes = strings.str.extract(TASK_TEXT_RE)
+    matched = codes[0].notna().to_numpy()
+    codes = codes[matched]
+    code_row = row[matched]
+    first = np.append(True, code_row[1:] != code_row[:-1])  # leftmost per row
+    codes = codes[first]
+    code_row = code_row[first]
+    frame = np.searchsorted(starts, code_row, side="right") - 1
+    return list(zip(
+        frame.tolist(),
+        (code_row - np.asarray(starts)[frame]).tolist(),
+        zip(codes[0].str.zfill(2), codes[1].str.zfill(2)),
+        category[cell_row[matched][first]].tolist(),
+    ))
+
+
+# Parsed workbooks are cached as JSON files named after the SHA-256 of the
+# workbook and CACHE_VERSION; bump it whenever the parsed data changes.
+CACHE_VERSION = 3
+
+
+def _cache_dir() -> str | None:
+    """Return ``$TASK_REPORT_CACHE_DIR`` (default ``~/.cache/task_report``).
+
+    ``None`` when ``TASK_REPORT_CACHE=0`` disables the cache.
+    """
+    if os.environ.get("TASK_REPORT_CACHE", "1") == "0":
+        return None
+    return os.environ.get("TASK_REPORT_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "task_report"
+    )
+
+
+def _cache_entry(kind: str, digest: str) -> str | None:
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    return os.path.join(directory, f"{digest}-{kind}-v{CACHE_VERSION}.json")
+
+
+def _cache_load(entry: str | None):
+    if entry is None:
+        return None
+    try:
+        with open(entry, "r", encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_save(entry: str | None, data) -> None:
+    """Write ``data`` to ``entry`` atomically; cell values JSON cannot hold become strings."""
+    if entry is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        write_json_atomic(entry, data, default=str)
+    except OSError as e:
+        sys.stderr.write(f"Failed to write cache '{entry}': {e}\n")
+
+
+def _cached(filename: str, kind: str, parse, encode, decode, cache: bool = True):
+    """Return ``parse()`` of ``filename``, through the cache when ``cache`` is set.
+
+    Results are stored as ``encode(result)`` and restored with ``decode``;
+    empty results (nothing parsed or the file could not be read) are not
+    cached.
+    """
+    entry = None
+    if cache and _cache_dir() is not None:
+        try:
+            entry = _cache_entry(kind, file_hash(filename))
+        except OSError:
+            pass  # missing file, reported by parse()
+    data = _cache_load(entry)
+    if data is not None:
+        return decode(data)
+    result = parse()
+    if result:
+        _cache_save(entry, encode(result))
+    return result
+
+
+def _task_sheets(sheet_names) -> list:
+    """Return the form sheets, skipping summary or other sheets."""
+    return [sheet for sheet in sheet_names if re.match(r"\d+", sheet)]
+
+
+def _sheet_frame(ws) -> "pd.DataFrame":
+    return pd.DataFrame(list(ws.iter_rows(values_only=True)), dtype=object)
+
+
+def _scan_ledger_sheets(filename: str, wb, sheets: list) -> list:
+    """Read the form ``sheets`` of ``filename`` and scan them.
+
+    ``wb`` is the workbook opened with :func:`_open_ledger`.  Returns one
+    ``{"name", "return_col", "tasks", "marks"}`` dict per sheet.  ``tasks``
+    lists ``(row, (form_no, index), category)`` with the one-based
+    worksheet row, found in the cell values as pandas reads them, that is
+    the cached results of formulas.  ``marks`` lists
+    ``(row, (form_no, index), flag)`` for the rows :func:`mark_zs_file`
+    flags, found in the cells as written like the former cell loop did: it
+    only looks at column A, or at the whole row when column A is empty,
+    and ``flag`` is the current content of the ``"是否返回"`` cell.
+    """
+    import openpyxl
+    from openpyxl.worksheet.formula import ArrayFormula, DataTableFormula
+
+    def is_formula(value: object) -> bool:
+        return (isinstance(value, str) and value.startswith("=")) or isinstance(
+            value, (ArrayFormula, DataTableFormula)
+        )
+
+    cells = [_sheet_frame(wb[name]) for name in sheets]
+    with_formulas = {
+        number for number, df in enumerate(cells)
+        if any(is_formula(value) for value in df.to_numpy().ravel())
+    }
+    values = cells
+    if with_formulas:
+        cached = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+        try:
+            values = [
+                _sheet_frame(cached[name]) if number in with_formulas else df
+                for number, (name, df) in enumerate(zip(sheets, cells))
+            ]
+        finally:
+            cached.close()
+
+    result = []
+    for name, df in zip(sheets, cells):
+        header = df.iloc[0].tolist() if len(df) else []
+        try:
+            return_col = header.index("是否返回") + 1
+        except ValueError:
+            return_col = 2
+        result.append({"name": name, "return_col": return_col, "tasks": [], "marks": []})
+    hits = _scan_sheets_frames(values)
+    for frame, row, key, category in hits:
+        result[frame]["tasks"].append((row + 1, key, category))
+    for frame, row, key, _ in _scan_sheets_frames(cells) if with_formulas else hits:
+        data = cells[frame]
+        # if column A holds a code it is the row's first match, so the code
+        # found in the whole row is the one in column A
+        first = data.iat[row, 0]
+        marked = pd.isna(first) or (isinstance(first, str) and TASK_TEXT_RE.search(first) is not None)
+        if row == 0 or not marked:  # header row, code outside column A
+            continue
+        column = result[frame]["return_col"] - 1
+        flag = data.iat[row, column] if column < data.shape[1] else None
+        result[frame]["marks"].append((row + 1, key, flag))
+    return result
+
+
+def _open_ledger(filename: str):
+    import openpyxl
+
+    # cells as written, formulas included; cached formula results are only
+    # read for the sheets that contain formulas
+    return openpyxl.load_workbook(filename, read_only=True)
+
+
+def _scan_sheets(filename: str, sheets: list) -> list:
+    """Worker: read ``sheets`` of ``filename`` and scan them in order."""
+    wb = _open_ledger(filename)
+    try:
+        return _scan_ledger_sheets(filename, wb, sheets)
+    finally:
+        wb.close()
+
+
+class ZsLedger:
+    """The parsed ZS workbook shared by the report, marking and 汇总 update.
+
+    ``sheets`` holds the form sheets as returned by
+    :func:`_scan_ledger_sheets`, ``summary_rows`` the value rows of the
+    "汇总" sheet (from row 2, padded to five columns) or ``None`` when the
+    workbook has no such sheet.
+    """
+
+    def __init__(self, filename: str, sheets: list, summary_rows: list | None):
+        self.filename = filename
+        self.sheets = sheets
+        self.summary_rows = summary_rows
+
+    def to_dict(self) -> dict:
+        """Return the ledger as JSON-compatible data."""
+        return {
+            "sheets": [
+                dict(sheet, tasks=[
+                    [row, form_no, index, category]
+                    for row, (form_no, index), category in sheet["tasks"]
+                ], marks=[
+                    [row, form_no, index, flag]
+                    for row, (form_no, index), flag in sheet["marks"]
+                ])
+                for sheet in self.sheets
+            ],
+            "summary_rows": self.summary_rows,
+        }
+
+    @classmethod
+    def from_dict(cls, filename: str, data: dict) -> "ZsLedger":
+        """Rebuild a ledger of ``filename`` from :meth:`to_dict` data."""
+        sheets = [
+            dict(sheet, tasks=[
+                (row, (form_no, index), category)
+                for row, form_no, index, category in sheet["tasks"]
+            ], marks=[
+                (row, (form_no, index), flag)
+                for row, form_no, index, flag in sheet["marks"]
+            ])
+            for sheet in data["sheets"]
+        ]
+        return cls(filename, sheets, data["summary_rows"])
+
+    def required_tasks(self) -> dict[tuple[str, str], str | None]:
+        """Return ``{(form_no, index): category}`` in workbook order."""
+        tasks: dict[tuple[str, str], str | None] = {}
+        for sheet in self.sheets:
+            for _, key, category in sheet["tasks"]:
+                tasks[key] = category
+        return tasks
+
+    def plan_marks(
+        self, returned_tasks: dict[str, set[str]]
+    ) -> tuple[dict[str, dict[tuple[int, int], object]], dict[str, dict[str, int]]]:
+        """Plan the cells :func:`mark_zs_file` changes.
+
+        Returns ``(changes, type_summary)`` where ``changes`` maps sheet
+        names to ``{(row, column): value}`` for every cell whose value
+        differs from the one to write.
+        """
+        changes: dict[str, dict[tuple[int, int], object]] = {}
+        form_stats: dict[str, list[int]] = {}
+
+        for sheet in self.sheets:
+            sheet_changes = changes.setdefault(sheet["name"], {})
+            total = 0
+            returned_count = 0
+            for row, (form_no, index), current in sheet["marks"]:
+                returned_indices = returned_tasks.get(form_no, set())
+                returned_flag = ("AL" in returned_indices) or (index in returned_indices)
+                flag = "是" if returned_flag else "否"
+                if current != flag:
+                    sheet_changes[(row, sheet["return_col"])] = flag
+                total += 1
+                if returned_flag:
+                    returned_count += 1
+
+            base_form = re.match(r"(\d+)", sheet["name"]).group(1).zfill(2)
+            prev = form_stats.get(base_form, [0, 0])
+            form_stats[base_form] = [prev[0] + total, prev[1] + returned_count]
+
+        type_summary: dict[str, dict[str, int]] = {}
+        if self.summary_rows is not None:
+            sheet_changes = changes.setdefault("汇总", {})
+            for row, values in enumerate(self.summary_rows, start=2):
+                values = list(values)
+                form_val = values[0]
+                form_str = str(form_val).strip() if form_val is not None else ""
+                if form_str and re.match(r"\d+", form_str):
+                    form_no = re.match(r"\d+", form_str).group(0).zfill(2)
+                    stats = form_stats.get(form_no)
+                    if stats:
+                        for column, value in ((4, stats[0]), (5, stats[1])):
+                            if values[column - 1] != value:
+                                sheet_changes[(row, column)] = value
+                            values[column - 1] = value
+
+                task_type, total, returned_val = values[1], values[3], values[4]
+                if task_type is None or total is None or returned_val is None:
+                    continue
+                try:
+                    total_i = int(total)
+                    returned_i = int(returned_val)
+                except Exception:
+                    continue
+
+                task_key = str(task_type).strip()
+                if "核补地形" in task_key and task_key != "核补地形":
+                    task_key = "核补地形"
+
+                if total_i == 0 and returned_i == 0:
+                    # Skip categories with no tasks
+                    continue
+
+                info = type_summary.setdefault(task_key, {"提出数量": 0, "符合要求数量": 0})
+
+                info["提出数量"] += total_i
+                info["符合要求数量"] += returned_i
+
+        return {k: v for k, v in changes.items() if v}, type_summary
+
+
+def load_zs_ledger(
+    filename: str = DEFAULT_ZS_FILE, jobs: int = 1, cache: bool = True
+) -> ZsLedger | None:
+    """Parse the ZS workbook once into a :class:`ZsLedger`.
+
+    The form sheets are read in a single read-only pass over the workbook.
+    With ``jobs > 1`` they are split into ``jobs`` groups which are read
+    and scanned in worker processes.  With ``cache`` an unchanged workbook
+    is not parsed again but restored from the cache.  Returns ``None`` if
+    the workbook cannot be read.
     """
+    return _cached(
+        filename, "ledger", lambda: _parse_zs_ledger(filename, jobs),
+        ZsLedger.to_dict, lambda data: ZsLedger.from_dict(filename, data), cache,
+    )
+
+
+def _parse_zs_ledger(filename: str, jobs: int) -> ZsLedger | None:
     try:
-        xls = pd.ExcelFile(filename)
+        wb = _open_ledger(filename)
     except FileNotFoundError:
         sys.stderr.write(f"File '{filename}' not found\n")
-        return {}
+        return None
     except Exception as e:
         sys.stderr.write(f"Failed to read '{filename}': {e}\n")
-        return {}
+        return None
 
-    ROAD_LEVEL = "\u9053\u8def\u6284\u5e73"  # 道路抄平
-    TERRAIN = "\u6838\u8865\u5730\u5f62"  # 核补地形
-
-    tasks: dict[tuple[str, str], str | None] = {}
-    for sheet in xls.sheet_names:
-        if not re.match(r"\d+", sheet):
-            continue  # skip summary or other sheets
-        df = xls.parse(sheet, header=None)
-        for row in df.itertuples(index=False):
-            cells = [c for c in row if isinstance(c, str)]
-            if not cells:
-                continue
-            # Determine classification based on keywords in the row
-            classification = None
-            row_text = "".join(cells)
-            if "\u6284\u5e73" in row_text or "\u8d85\u5e73" in row_text:
-                classification = ROAD_LEVEL
-            elif "\u6838\u8865" in row_text:
-                classification = TERRAIN
-            for cell in cells:
-                m = TASK_TEXT_RE.search(cell)
-                if m:
-                    form_no, index = m.groups()
-                    tasks[(form_no.zfill(2), index.zfill(2))] = classification
-                    break
-    return tasks
-
-
-def _load_returned_tasks(filename: str = DEFAULT_RETURNED_FILE):
     try:
-        df = pd.read_excel(filename, header=None)
+        sheets = _task_sheets(wb.sheetnames)
+        summary_rows = None
+        if "汇总" in wb.sheetnames:
+            summary_rows = [
+                list(values) + [None] * (5 - len(values))
+                for values in wb["汇总"].iter_rows(min_row=2, values_only=True)
+            ]
+        if jobs > 1 and len(sheets) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            # contiguous groups keep the workbook order when concatenated
+            size = -(-len(sheets) // jobs)
+            groups = [sheets[i:i + size] for i in range(0, len(sheets), size)]
+            with ProcessPoolExecutor(max_workers=len(groups)) as pool:
+                results = pool.map(_scan_sheets, [filename] * len(groups), groups)
+                parsed = [sheet for result in results for sheet in result]
+        else:
+            parsed = _scan_ledger_sheets(filename, wb, sheets)
+    finally:
+        wb.close()
+    return ZsLedger(filename, parsed, summary_rows)
+
+
+def _load_required_tasks(filename: str = DEFAULT_ZS_FILE, jobs: int = 1):
+    """Load required tasks from the ZS workbook.
+
+    Returns a mapping ``{(form_no, index): category}`` where ``category`` is
+    either ``"\u9053\u8def\u6284\u5e73"`` (road levelling), ``"\u6838\u8865\u5730\u5f62"``
+    (terrain check) or ``None`` when no keywords match.
+    """
+    ledger = load_zs_ledger(filename, jobs)
+    return ledger.required_tasks() if ledger else {}
+
+
+def _load_returned_tasks(
+    filename: str = DEFAULT_RETURNED_FILE, cache: bool = True, strict: bool = False
+):
+    """Load ``{form_no: indices}`` from the returned table, through the cache.
+
+    A table that cannot be read gives an empty mapping, or raises with
+    ``strict``.
+    """
+    return _cached(
+        filename, "returned",
+        lambda: (_read_returned_tasks if strict else _parse_returned_tasks)(filename),
+        lambda returned: {form_no: sorted(indices) for form_no, indices in returned.items()},
+        lambda data: defaultdict(set, {k: set(v) for k, v in data.items()}),
+        cache,
+    )
+
+
+def _parse_returned_tasks(filename: str):
+    try:
+        return _read_returned_tasks(filename)
     except FileNotFoundError:
         sys.stderr.write(f"File '{filename}' not found\n")
         return {}
@@ -118,6 +514,9 @@ def _load_returned_tasks(filename: str = DEFAULT_RETURNED_FILE):
         sys.stderr.write(f"Failed to read '{filename}': {e}\n")
         return {}
 
+
+def _read_returned_tasks(filename: str):
+    df = pd.read_excel(filename, header=None)
     returned = defaultdict(set)  # form_no -> set of indices or {"AL"}
     for value in df.iloc[:, 1].dropna().tolist():
         text = str(value)
@@ -144,65 +543,76 @@ def compute_unreturned(required_tasks, returned_tasks):
     return remaining
 
 
-def compute_summary(required_tasks, returned_tasks):
-    """Compute remaining tasks and per-form summary.
-
-    ``required_tasks`` is a mapping ``{(form_no, index): category}``.
-    ``returned_tasks`` maps form numbers to sets of returned indices or
-    ``{"AL"}`` when all are returned.
-
-    Returns ``(remaining, summary, categories, detail)`` where ``categories``
-    lists totals and returned counts for each recognised category and ``detail``
-    contains one row per classified task with a returned flag.
-    """
+def _required_map(required_tasks) -> dict[str, dict[str, str | None]]:
+    """Group ``{(form_no, index): category}`` by form number."""
     required_map: defaultdict[str, dict[str, str | None]] = defaultdict(dict)
     for (form_no, index), category in required_tasks.items():
         required_map[form_no][index] = category
+    return required_map
 
+
+def _summarize_form(form_no: str, tasks: dict[str, str | None], returned_indices) -> dict:
+    """Summarize one form: its summary row, remaining tasks, details and category counts."""
+    required_indices = set(tasks.keys())
+    if "AL" in returned_indices:
+        returned_count = len(required_indices)
+        missing_indices: List[str] = []
+    else:
+        missing_indices = sorted(required_indices - returned_indices)
+        returned_count = len(required_indices) - len(missing_indices)
+    ratio = (
+        returned_count / len(required_indices)
+        if required_indices
+        else 0
+    )
+    remaining = []
+    detail_rows: List[dict] = []
+    class_counts: dict[str, list[int]] = {}
+    for idx, cat in tasks.items():
+        returned_flag = "AL" in returned_indices or idx in returned_indices
+        if cat:
+            counts = class_counts.setdefault(cat, [0, 0])
+            counts[0] += 1
+            if returned_flag:
+                counts[1] += 1
+            detail_rows.append(
+                {
+                    "Category": cat,
+                    "Task": f"{form_no}{idx}",
+                    "Returned": "Yes" if returned_flag else "No",
+                }
+            )
+        if idx in missing_indices:
+            remaining.append((form_no, idx))
+    return {
+        "summary": {
+            "Form": form_no,
+            "Required": len(required_indices),
+            "Returned": returned_count,
+            "Missing": " ".join(missing_indices),
+            "Ratio": ratio,
+        },
+        "remaining": remaining,
+        "detail": detail_rows,
+        "categories": class_counts,
+    }
+
+
+def _combine_forms(forms: dict[str, dict]):
+    """Join :func:`_summarize_form` results like :func:`compute_summary` returns them."""
     summary = []
     remaining = []
     class_total: defaultdict[str, int] = defaultdict(int)
     class_returned: defaultdict[str, int] = defaultdict(int)
     detail_rows: List[dict] = []
-    for form_no in sorted(required_map):
-        tasks = required_map[form_no]
-        required_indices = set(tasks.keys())
-        returned_indices = returned_tasks.get(form_no, set())
-        if "AL" in returned_indices:
-            returned_count = len(required_indices)
-            missing_indices: List[str] = []
-        else:
-            missing_indices = sorted(required_indices - returned_indices)
-            returned_count = len(required_indices) - len(missing_indices)
-        ratio = (
-            returned_count / len(required_indices)
-            if required_indices
-            else 0
-        )
-        summary.append(
-            {
-                "Form": form_no,
-                "Required": len(required_indices),
-                "Returned": returned_count,
-                "Missing": " ".join(missing_indices),
-                "Ratio": ratio,
-            }
-        )
-        for idx, cat in tasks.items():
-            returned_flag = "AL" in returned_indices or idx in returned_indices
-            if cat:
-                class_total[cat] += 1
-                if returned_flag:
-                    class_returned[cat] += 1
-                detail_rows.append(
-                    {
-                        "Category": cat,
-                        "Task": f"{form_no}{idx}",
-                        "Returned": "Yes" if returned_flag else "No",
-                    }
-                )
-            if idx in missing_indices:
-                remaining.append((form_no, idx))
+    for form_no in sorted(forms):
+        form = forms[form_no]
+        summary.append(form["summary"])
+        remaining.extend(form["remaining"])
+        detail_rows.extend(form["detail"])
+        for cat, (total, returned) in form["categories"].items():
+            class_total[cat] += total
+            class_returned[cat] += returned
     category_summary = [
         {"Category": k, "Total": class_total[k], "Returned": class_returned.get(k, 0)}
         for k in class_total
@@ -210,6 +620,24 @@ def compute_summary(required_tasks, returned_tasks):
     return remaining, summary, category_summary, detail_rows
 
 
+def compute_summary(required_tasks, returned_tasks):
+    """Compute remaining tasks and per-form summary.
+
+    ``required_tasks`` is a mapping ``{(form_no, index): category}``.
+    ``returned_tasks`` maps form numbers to sets of returned indices or
+    ``{"AL"}`` when all are returned.
+
+    Returns ``(remaining, summary, categories, detail)`` where ``categories``
+    lists totals and returned counts for each recognised category and ``detail``
+    contains one row per classified task with a returned flag.
+    """
+    forms = {
+        form_no: _summarize_form(form_no, tasks, returned_tasks.get(form_no, set()))
+        for form_no, tasks in _required_map(required_tasks).items()
+    }
+    return _combine_forms(forms)
+
+
 def save_report(
     remaining: Iterable[tuple[str, str]],
     summary: List[dict],
@@ -242,29 +670,76 @@ def save_report(
         sys.stderr.write(f"Failed to write report '{output_file}': {e}\n")
 
 
+class BarChart:
+    """Bar chart of the return ratio of each form.
+
+    The figure stays open between :meth:`save` calls, so while the forms
+    stay the same only the bar heights are updated before it is saved
+    again (used by :func:`watch`).
+    """
+
+    def __init__(self):
+        self._figure = None
+        self._forms = None
+        self._bars = None
+
+    def save(self, summary: List[dict], chart_file: str) -> None:
+        if not summary:
+            return
+        forms = [item["Form"] for item in summary]
+        ratios = [item["Ratio"] for item in summary]
+        if forms != self._forms:
+            self.close()
+            self._figure = plt.figure(figsize=(max(6, len(forms) * 0.6), 4))
+            self._bars = plt.bar(forms, ratios, color="skyblue")
+            plt.ylim(0, 1)
+            plt.xlabel("Form")
+            plt.ylabel("Returned / Required")
+            plt.title("Return Ratio by Form")
+            plt.tight_layout()
+            self._forms = forms
+        else:
+            for bar, ratio in zip(self._bars, ratios):
+                bar.set_height(ratio)
+        try:
+            self._figure.savefig(chart_file)
+        except Exception as e:
+            sys.stderr.write(f"Failed to save chart '{chart_file}': {e}\n")
+
+    def close(self) -> None:
+        if self._figure is not None:
+            plt.close(self._figure)
+        self._figure = self._forms = self._bars = None
+
+
 def save_bar_chart(summary: List[dict], chart_file: str) -> None:
     """Save a bar chart of return ratios for each form."""
-    if not summary:
-        return
-    forms = [item["Form"] for item in summary]
-    ratios = [item["Ratio"] for item in summary]
-    plt.figure(figsize=(max(6, len(forms) * 0.6), 4))
-    plt.bar(forms, ratios, color="skyblue")
-    plt.ylim(0, 1)
-    plt.xlabel("Form")
-    plt.ylabel("Returned / Required")
-    plt.title("Return Ratio by Form")
-    plt.tight_layout()
+    chart = BarChart()
     try:
-        plt.savefig(chart_file)
-    except Exception as e:
-        sys.stderr.write(f"Failed to save chart '{chart_file}': {e}\n")
+        chart.save(summary, chart_file)
     finally:
-        plt.close()
+        chart.close()
+
+
+def _marks_entry(zs_file: str, returned_tasks: dict[str, set[str]]) -> str | None:
+    """Cache entry of marking ``zs_file`` with ``returned_tasks``."""
+    if _cache_dir() is None:
+        return None
+    try:
+        key = json.dumps([
+            file_hash(zs_file),
+            {form_no: sorted(indices) for form_no, indices in sorted(returned_tasks.items())},
+        ])
+    except OSError:
+        return None
+    return _cache_entry("marks", hashlib.sha256(key.encode("utf-8")).hexdigest())
 
 
 def mark_zs_file(
-    zs_file: str, returned_tasks: dict[str, set[str]]
+    zs_file: str,
+    returned_tasks: dict[str, set[str]],
+    ledger: ZsLedger | None = None,
+    cache: bool = True,
 ) -> tuple[str, dict[str, dict[str, int]]]:
     """Write return flags into the ZS workbook and update the summary sheet.
 
@@ -275,6 +750,12 @@ def mark_zs_file(
     task type. The processed workbook is saved with ``_processed``
     appended to the original file name and the path of the written file
     is returned together with the type summary.
+
+    The cells to change are planned on ``ledger``, parsed from ``zs_file``
+    with :func:`load_zs_ledger` unless given; the workbook is then opened
+    for editing only to write those cells, and simply copied when nothing
+    changes.  With ``cache`` an output written earlier from the same
+    workbook and returned tasks is kept as it is.
     """
     try:
         import openpyxl
@@ -282,93 +763,256 @@ def mark_zs_file(
         sys.stderr.write("openpyxl is required to mark the workbook\n")
         return ""
 
-    wb = openpyxl.load_workbook(zs_file)
-    form_stats: dict[str, list[int]] = {}
+    base, ext = os.path.splitext(zs_file)
+    output_file = f"{base}_processed{ext}"
+    entry = _marks_entry(zs_file, returned_tasks) if cache else None
+    data = _cache_load(entry)
+    if data is not None and os.path.exists(output_file) and file_hash(output_file) == data["sha256"]:
+        return output_file, data["type_summary"]
 
-    for sheet_name in wb.sheetnames:
-        if not re.match(r"\d+", sheet_name):
-            continue
-        ws = wb[sheet_name]
-        header = [c.value for c in next(ws.iter_rows(min_row=1, max_row=1))]
-        try:
-            return_col = header.index("是否返回") + 1
-        except ValueError:
-            return_col = 2
-        task_col = 1
-        total = 0
-        returned_count = 0
-        for row in range(2, ws.max_row + 1):
-            cells = [ws.cell(row=row, column=task_col).value]
-            if cells[0] is None:
-                # if column A empty, check rest of row
-                cells = [c.value for c in ws[row]]
-            code = None
-            for cell in cells:
-                if isinstance(cell, str):
-                    m = TASK_TEXT_RE.search(cell)
-                    if m:
-                        code = (m.group(1).zfill(2), m.group(2).zfill(2))
-                        break
-            if not code:
-                continue
-            form_no, index = code
-            returned_indices = returned_tasks.get(form_no, set())
-            returned_flag = ("AL" in returned_indices) or (index in returned_indices)
-            ws.cell(row=row, column=return_col, value="是" if returned_flag else "否")
-            total += 1
-            if returned_flag:
-                returned_count += 1
-
-        base_form = re.match(r"(\d+)", sheet_name).group(1).zfill(2)
-        prev = form_stats.get(base_form, [0, 0])
-        form_stats[base_form] = [prev[0] + total, prev[1] + returned_count]
-
-    type_summary: dict[str, dict[str, int]] = {}
-    if "汇总" in wb.sheetnames:
-        ws = wb["汇总"]
-        for row in range(2, ws.max_row + 1):
-            form_val = ws.cell(row=row, column=1).value
-            if form_val is None:
-                continue
-            form_str = str(form_val).strip()
-            if not form_str or not re.match(r"\d+", form_str):
-                continue
-            form_no = re.match(r"\d+", form_str).group(0).zfill(2)
-            stats = form_stats.get(form_no)
-            if stats:
-                ws.cell(row=row, column=4, value=stats[0])
-                ws.cell(row=row, column=5, value=stats[1])
-
-        for row in range(2, ws.max_row + 1):
-            task_type = ws.cell(row=row, column=2).value
-            total = ws.cell(row=row, column=4).value
-            returned_val = ws.cell(row=row, column=5).value
-            if task_type is None or total is None or returned_val is None:
-                continue
+    if ledger is None:
+        ledger = load_zs_ledger(zs_file, cache=cache)
+        if ledger is None:
+            return ""
+    changes, type_summary = ledger.plan_marks(returned_tasks)
+
+    if not changes:
+        shutil.copyfile(zs_file, output_file)
+    else:
+        wb = openpyxl.load_workbook(zs_file)
+        for sheet_name, cells in changes.items():
+            ws = wb[sheet_name]
+            for (row, column), value in cells.items():
+                ws.cell(row=row, column=column, value=value)
+        wb.save(output_file)
+    _cache_save(entry, {"sha256": file_hash(output_file), "type_summary": type_summary})
+    return output_file, type_summary
+
+
+def _load_manifest(path: str) -> list[dict]:
+    """Read the projects of a batch manifest.
+
+    A ``.json`` manifest is a list of objects, any other file a CSV table
+    with a header row.  Each project needs ``zs`` and ``returned`` and may
+    give ``output`` (report), ``chart`` and ``name`` (default: the ZS file
+    name).  Relative paths are taken relative to the manifest.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", newline="", encoding="utf-8-sig") as fp:
+        if path.lower().endswith(".json"):
+            entries = json.load(fp)
+            if not isinstance(entries, list):
+                raise ValueError(f"{path}: expected a list of projects")
+        else:
+            entries = list(csv.DictReader(fp))
+    projects = []
+    for number, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: project {number} is not an object")
+        if not entry.get("zs") or not entry.get("returned"):
+            raise ValueError(f"{path}: project {number} needs 'zs' and 'returned'")
+        project = {
+            key: os.path.join(base, value) if key in ("zs", "returned", "output", "chart") and value else value
+            for key, value in entry.items()
+        }
+        if not project.get("name"):
+            project["name"] = os.path.splitext(os.path.basename(entry["zs"]))[0]
+        projects.append(project)
+    return projects
+
+
+def _report_project(project: dict, cache: bool = True) -> dict:
+    """Worker: write the outputs of one batch project and return its summary."""
+    ledger = load_zs_ledger(project["zs"], 1, cache)
+    required = ledger.required_tasks() if ledger else {}
+    returned = _load_returned_tasks(project["returned"], cache)
+    remaining, summary, categories, detail = compute_summary(required, returned)
+    processed, _ = mark_zs_file(project["zs"], returned, ledger, cache) if ledger else ("", {})
+    if project.get("output"):
+        save_report(remaining, summary, categories, detail, project["output"])
+    if project.get("chart"):
+        save_bar_chart(summary, project["chart"])
+    return {
+        "name": project["name"],
+        "summary": summary,
+        "categories": categories,
+        "remaining": len(remaining),
+        "processed": processed,
+        "output": project.get("output"),
+    }
+
+
+def run_batch(manifest: str, jobs: int = 1, cache: bool = True) -> list[dict]:
+    """Report every project of ``manifest``, in ``jobs`` worker processes.
+
+    Returns one result per project in manifest order; a project that
+    failed only has ``"name"`` and ``"error"``.
+    """
+    projects = _load_manifest(manifest)
+    results: list[dict] = [None] * len(projects)
+
+    def done(number: int, result=None, error=None) -> None:
+        name = projects[number]["name"]
+        if error is not None:
+            sys.stderr.write(f"Project '{name}' failed: {error}\n")
+            result = {"name": name, "error": str(error)}
+        else:
+            required = sum(item["Required"] for item in result["summary"])
+            print(f"{name}: {required - result['remaining']}/{required} returned")
+        results[number] = result
+
+    if jobs > 1 and len(projects) > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=min(jobs, len(projects))) as pool:
+            futures = {
+                pool.submit(_report_project, project, cache): number
+                for number, project in enumerate(projects)
+            }
+            for future in as_completed(futures):
+                try:
+                    done(futures[future], future.result())
+                except Exception as e:
+                    done(futures[future], error=e)
+    else:
+        for number, project in enumerate(projects):
             try:
-                total_i = int(total)
-                returned_i = int(returned_val)
-            except Exception:
-                continue
+                done(number, _report_project(project, cache))
+            except Exception as e:
+                done(number, error=e)
+    return results
+
 
+def save_batch_summary(results: list[dict], output_file: str) -> None:
+    """Save the consolidated summary of :func:`run_batch` to ``output_file``.
 
-            task_key = str(task_type).strip()
-            if "核补地形" in task_key and task_key != "核补地形":
-                task_key = "核补地形"
+    The workbook has a ``Projects`` sheet with the totals of every project,
+    a ``Forms`` sheet with the per-form summaries and a ``Category`` sheet
+    with the category totals, each row tagged with its project.
+    """
+    projects, forms, categories = [], [], []
+    for result in results:
+        if "error" in result:
+            projects.append({"Project": result["name"], "Error": result["error"]})
+            continue
+        required = sum(item["Required"] for item in result["summary"])
+        returned = sum(item["Returned"] for item in result["summary"])
+        projects.append(
+            {
+                "Project": result["name"],
+                "Forms": len(result["summary"]),
+                "Required": required,
+                "Returned": returned,
+                "Remaining": result["remaining"],
+                "Ratio": returned / required if required else 0,
+                "Report": result["output"],
+                "Processed": result["processed"],
+            }
+        )
+        forms.extend(dict(Project=result["name"], **item) for item in result["summary"])
+        categories.extend(dict(Project=result["name"], **item) for item in result["categories"])
+    try:
+        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+            pd.DataFrame(projects).to_excel(writer, index=False, sheet_name="Projects")
+            pd.DataFrame(forms).to_excel(writer, index=False, sheet_name="Forms")
+            if categories:
+                pd.DataFrame(categories).to_excel(writer, index=False, sheet_name="Category")
+    except Exception as e:
+        sys.stderr.write(f"Failed to write summary '{output_file}': {e}\n")
 
-            if total_i == 0 and returned_i == 0:
-                # Skip categories with no tasks
+
+def _file_state(path: str):
+    """Return ``(mtime, size)`` of ``path`` or ``None`` if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def watch(
+    args, ledger: ZsLedger | None, returned_tasks, forms: dict, cache: bool = True,
+    chart: BarChart | None = None,
+) -> None:
+    """Rewrite the outputs of ``args`` whenever the input workbooks change.
+
+    The workbooks are polled every ``args.interval`` seconds.  When the
+    returned table changes only the forms whose returned indices changed
+    are summarized again; a changed ZS workbook is parsed again as a whole.
+    ``forms`` holds the :func:`_summarize_form` results of the first run
+    and ``chart`` the chart it saved.  An update that fails, for example
+    on a workbook caught in the middle of being saved or an output that is
+    open in Excel, is logged and tried again at the next poll.  Stops on
+    Ctrl+C.
+    """
+    required_map = _required_map(ledger.required_tasks() if ledger else {})
+    states = {path: _file_state(path) for path in (args.zs, args.returned)}
+    last_error = None
+    print(f"Watching {args.returned} and {args.zs}, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(args.interval)
+            current = {path: _file_state(path) for path in states}
+            if current == states:
+                continue
+            start = time.perf_counter()
+            try:
+                new_ledger, new_map = ledger, required_map
+                if current[args.zs] != states[args.zs]:
+                    new_ledger = load_zs_ledger(args.zs, args.jobs, cache)
+                    if new_ledger is None:
+                        raise ValueError(f"cannot read '{args.zs}'")
+                    new_map = _required_map(new_ledger.required_tasks())
+                    changed = set(new_map) | set(forms)
+                new_returned = _load_returned_tasks(args.returned, cache, strict=True)
+                if new_ledger is ledger:
+                    changed = {
+                        form_no for form_no in new_map
+                        if new_returned.get(form_no, set()) != returned_tasks.get(form_no, set())
+                    }
+                new_forms = dict(forms)
+                for form_no in changed:
+                    if form_no in new_map:
+                        new_forms[form_no] = _summarize_form(
+                            form_no, new_map[form_no], new_returned.get(form_no, set())
+                        )
+                    else:
+                        new_forms.pop(form_no, None)
+                if changed:
+                    _write_outputs(
+                        args, new_ledger, new_returned, _combine_forms(new_forms), cache, chart
+                    )
+            except Exception as e:
+                # keep the previous state, so the next poll tries again
+                if str(e) != last_error:
+                    sys.stderr.write(
+                        f"{time.strftime('%H:%M:%S')} update failed, retrying: {e}\n"
+                    )
+                    last_error = str(e)
                 continue
+            states, last_error = current, None
+            ledger, required_map = new_ledger, new_map
+            returned_tasks, forms = new_returned, new_forms
+            print(
+                f"{time.strftime('%H:%M:%S')} {len(changed)} forms updated "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+    except KeyboardInterrupt:
+        pass
 
-            info = type_summary.setdefault(task_key, {"提出数量": 0, "符合要求数量": 0})
 
-            info["提出数量"] += total_i
-            info["符合要求数量"] += returned_i
+def _write_outputs(args, ledger, returned, results, cache: bool, chart: BarChart | None) -> tuple:
+    """Write the marked workbook, the report and the chart.
 
-    base, ext = os.path.splitext(zs_file)
-    output_file = f"{base}_processed{ext}"
-    wb.save(output_file)
-    return output_file, type_summary
+    Returns ``(processed, type_summary)`` of :func:`mark_zs_file`.
+    """
+    remaining, summary, categories, detail = results
+    processed, type_summary = mark_zs_file(args.zs, returned, ledger, cache) if ledger else ("", {})
+    if args.output:
+        save_report(remaining, summary, categories, detail, args.output)
+    if args.chart:
+        chart.save(summary, args.chart)
+    return processed, type_summary
 
 
 def main(argv=None):
@@ -393,17 +1037,74 @@ def main(argv=None):
         "--chart",
         help="Save a bar chart of return ratios to this PNG file",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Read the form sheets (with --batch: the projects) in this many "
+             "worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and rewrite the outputs whenever the workbooks change",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="Seconds between checks for changes with --watch (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="MANIFEST",
+        help="Report every project listed in this JSON or CSV manifest "
+             "(zs, returned, output[, chart, name]) instead of --zs/--returned",
+    )
+    parser.add_argument(
+        "--batch-summary",
+        metavar="FILE",
+        help="Write a consolidated summary of all --batch projects to this Excel file",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse the workbooks again instead of using the cache in "
+             "$TASK_REPORT_CACHE_DIR (default: ~/.cache/task_report)",
+    )
     args = parser.parse_args(argv)
+    cache = not args.no_cache
+
+    if args.batch:
+        if args.watch:
+            parser.error("--watch cannot be combined with --batch")
+        try:
+            results = run_batch(args.batch, args.jobs, cache)
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"Failed to read manifest '{args.batch}': {e}\n")
+            return
+        if args.batch_summary:
+            save_batch_summary(results, args.batch_summary)
+            print(f"Summary written to {args.batch_summary}")
+        return
 
-    required = _load_required_tasks(args.zs)
-    returned = _load_returned_tasks(args.returned)
+    ledger = load_zs_ledger(args.zs, args.jobs, cache)
+    required = ledger.required_tasks() if ledger else {}
+    returned = _load_returned_tasks(args.returned, cache)
     if not required:
         sys.stderr.write("No required tasks loaded or file missing.\n")
     if not returned:
         sys.stderr.write("No returned task information loaded or file missing.\n")
 
-    remaining, summary, categories, detail = compute_summary(required, returned)
-    processed, type_summary = mark_zs_file(args.zs, returned)
+    forms = {
+        form_no: _summarize_form(form_no, tasks, returned.get(form_no, set()))
+        for form_no, tasks in _required_map(required).items()
+    }
+    results = _combine_forms(forms)
+    remaining, summary, categories, detail = results
+    chart = BarChart()
+    processed, type_summary = _write_outputs(args, ledger, returned, results, cache, chart)
     if processed:
         print(f"Processed workbook saved to {processed}")
         if type_summary:
@@ -411,10 +1112,8 @@ def main(argv=None):
             for t, info in type_summary.items():
                 print(f"{t}: \u63d0\u51fa{info['提出数量']}\u6761, \u8fd4\u56de{info['符合要求数量']}\u6761")
     if args.output:
-        save_report(remaining, summary, categories, detail, args.output)
         print(f"Report written to {args.output}")
     if args.chart:
-        save_bar_chart(summary, args.chart)
         print(f"Chart saved to {args.chart}")
 
     for idx, item in enumerate(summary, 1):
@@ -430,6 +1129,10 @@ def main(argv=None):
                 f"{cat['Category']}: {cat['Returned']}/{cat['Total']}"
             )
 
+    if args.watch:
+        watch(args, ledger, returned, forms, cache, chart)
+    chart.close()
+
 
 if __name__ == "__main__":
     main()